@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+# Batched random playouts with NumPy. Many boards are held in one
+# (batch, points) int8 array, in Board's own padded layout (see Board_Geometry),
+# and every step plays one random non-eye move on all of them at once, instead
+# of one Board.play_index call at a time.
+#
+# Like Board, it keeps a ko point per board rather than comparing positions, and
+# it never fills whole boards to find dead chains: a move can only capture (or be
+# suicide for) the chains touching it, so only those are grown, each from its
+# stone next to the move, and each stops as soon as it reaches a liberty (for most
+# chains, within a step or two). The growing is done on bitboards, one uint32 of
+# bits per row of the padded board, which each board's stones are also kept in.
+#
+# Requires numpy.
+
+import numpy as np
+
+from board import Board, Board_Geometry
+
+SUPPORTED_SIZES = (9, 13, 19) # the sizes Coord.API_STRINGS knows about
+
+NONE = Board.NONE
+BLACK = Board.BLACK
+WHITE = Board.WHITE
+BORDER = Board.BORDER
+
+MAX_ATTEMPTS = 4 # illegal random picks we retry per step before passing
+
+def _dilate(mask, width):
+    # True wherever at least one orthogonal neighbor is True. In the padded layout
+    # a shift by one never carries a point onto another row's points, only onto
+    # the border.
+    res = np.zeros_like(mask)
+    res[:, width:] |= mask[:, :-width]
+    res[:, :-width] |= mask[:, width:]
+    res[:, 1:] |= mask[:, :-1]
+    res[:, :-1] |= mask[:, 1:]
+    return res
+
+def _fill(seed, within, width):
+    # Grows seed through the connected points of within until it stops changing
+    reached = seed & within
+    while True:
+        grown = reached | (_dilate(reached, width) & within)
+        if np.array_equal(grown, reached):
+            return reached
+        reached = grown
+
+def _to_bits(mask, width):
+    # (batch, points) mask -> (batch, width) bitboards: bit x of row y is point (y, x)
+    rows = mask.reshape(len(mask), width, width).astype(np.uint32)
+    return (rows << np.arange(width, dtype=np.uint32)).sum(axis=2, dtype=np.uint32)
+
+def _from_bits(bits, width):
+    # The inverse of _to_bits
+    rows = (bits[:, :, None] >> np.arange(width, dtype=np.uint32)) & np.uint32(1)
+    return rows.reshape(len(bits), width*width).astype(bool)
+
+def _spread(bits):
+    # Like _dilate, on bitboards. Bits shifted off the board land on the border
+    # (or past it), where nothing is ever a stone or a liberty.
+    res = (bits << np.uint32(1)) | (bits >> np.uint32(1))
+    res[:, 1:] |= bits[:, :-1]
+    res[:, :-1] |= bits[:, 1:]
+    return res
+
+def _dead_chains(within, empty, seeds, width):
+    """ For each i, whether the chain of stones within[i] (a bitboard) through
+        point seeds[i] has no liberties (points of empty[i]). Returns
+        (dead, stones), where stones has a bitboard of the stones of each dead
+        chain, in order.
+    """
+    region = np.zeros_like(within)
+    region[np.arange(len(seeds)), seeds // width] = np.uint32(1) << (seeds % width).astype(np.uint32)
+    pending = np.arange(len(seeds)) # the chains still growing
+    dead = np.zeros(len(seeds), dtype=bool)
+    found = [] # (positions, stones) of dead chains, as they're found
+    while len(pending):
+        around = _spread(region)
+        alive = (around & empty).any(axis=1)
+        grown = region | (around & within)
+        stopped = ~alive & (grown == region).all(axis=1)
+        if stopped.any():
+            dead[pending[stopped]] = True
+            found.append((pending[stopped], region[stopped]))
+        growing = ~(alive | stopped)
+        pending = pending[growing]
+        region = grown[growing]
+        within = within[growing]
+        empty = empty[growing]
+    if not found:
+        return dead, np.zeros((0, within.shape[1]), dtype=np.uint32)
+    order = np.concatenate([positions for positions, stones in found]).argsort()
+    return dead, np.concatenate([stones for positions, stones in found])[order]
+
+class Batch_Boards(object):
+    @classmethod
+    def from_boards(klass, boards, repeats=1):
+        # Stacks each board.Board `repeats` times (consecutively)
+        size = boards[0].size
+        cells = np.repeat(np.array([np.frombuffer(str(board.cells), dtype=np.int8) for board in boards]), repeats, axis=0)
+        players = np.repeat(np.array([board.player for board in boards], dtype=np.int8), repeats)
+        kos = np.repeat(np.array([board.ko for board in boards]), repeats)
+        return klass(size, cells, players, kos)
+
+    def __init__(self, size, cells, players, kos=None, max_moves=None):
+        # cells is (batch, points), laid out like Board.cells
+        if size not in SUPPORTED_SIZES:
+            raise ValueError("Unsupported board size %s; sizes must be one of %s"%(size, SUPPORTED_SIZES))
+        self.size = size
+        self.geometry = Board_Geometry.for_size(size)
+        self.width = width = self.geometry.width
+        if cells.shape[1:] != (width*width,):
+            raise ValueError("Expected cells of shape (batch, %d), not %s"%(width*width, cells.shape))
+        self.cells = cells.astype(np.int8)
+        # stones[color] is cells == color again, as bitboards
+        self.stones = np.zeros((3, len(cells), width), dtype=np.uint32)
+        for color in (BLACK, WHITE):
+            self.stones[color] = _to_bits(self.cells == color, width)
+        self.on_board = _to_bits(self.cells[:1] != BORDER, width)[0]
+        self.players = players.astype(np.int8)
+        self.kos = np.zeros(len(cells), dtype=np.intp) if kos is None else kos.astype(np.intp) # 0: no ko
+        self.passes = np.zeros(len(cells), dtype=np.int8)
+        self.moves = 0
+        self.max_moves = max_moves if max_moves is not None else 3*size*size
+        self.done = np.zeros(len(cells), dtype=bool)
+        self.offsets = np.array([-width, -1, 1, width])
+
+    @property
+    def batch_size(self):
+        return self.cells.shape[0]
+
+    def _empty_bits(self, ids):
+        return self.on_board & ~(self.stones[BLACK, ids] | self.stones[WHITE, ids])
+
+    def step(self, rng=np.random):
+        # Plays one move (or a pass) on every board that isn't finished.
+        # Returns False once they all are.
+        if self.moves >= self.max_moves:
+            self.done[:] = True
+        # Finished boards drop out, so late steps only touch the few long games left
+        active = np.nonzero(~self.done)[0]
+        if not len(active):
+            return False
+        cells = self.cells
+        stones = self.stones
+        width = self.width
+        active_cells = cells[active]
+        active_players = self.players[active]
+
+        # Candidate points: empty, not the ko point, and not one of the mover's own
+        # one-point eyes (where every neighbor is ours or the edge)
+        candidates = (active_cells == NONE) & _dilate(
+            (active_cells != active_players[:, None]) & (active_cells != BORDER), width,
+        )
+        candidates[np.arange(len(active)), self.kos[active]] = False
+        num_candidates = candidates.sum(axis=1)
+
+        placed = np.zeros(len(active), dtype=bool)
+        for attempt_num in xrange(MAX_ATTEMPTS):
+            rows = np.nonzero(~placed & (num_candidates > 0))[0] # indices into active
+            if not len(rows):
+                break
+            # The k-th candidate of each board, for a uniformly random k
+            picks = (rng.random_sample(len(rows)) * num_candidates[rows]).astype(np.intp)
+            points = (candidates[rows].cumsum(axis=1, dtype=np.int16) > picks[:, None]).argmax(axis=1)
+            ids = active[rows]
+            movers = active_players[rows]
+            enemies = BLACK + WHITE - movers
+            point_bits = np.uint32(1) << (points % width).astype(np.uint32)
+            cells[ids, points] = movers
+            stones[movers, ids, points // width] |= point_bits
+
+            # Every enemy stone next to the move, and whether its chain is now dead.
+            # A chain touching the move on two sides is checked (and removed) twice,
+            # so its stones are counted twice, but then there are at least two of
+            # them, and num_captured only matters for whether it's 0 or 1.
+            neighbors = points[:, None] + self.offsets
+            touching_rows, touching_sides = np.nonzero(cells[ids[:, None], neighbors] == enemies[:, None])
+            touching_ids = ids[touching_rows]
+            dead, dead_stones = _dead_chains(
+                stones[enemies[touching_rows], touching_ids], self._empty_bits(touching_ids),
+                neighbors[touching_rows, touching_sides], width,
+            )
+            num_captured = np.zeros(len(rows), dtype=np.intp)
+            captured_at = np.zeros(len(rows), dtype=np.intp)
+            if dead.any():
+                capturing = touching_rows[dead]
+                chain_nums, captured_points = np.nonzero(_from_bits(dead_stones, width))
+                cells[ids[capturing[chain_nums]], captured_points] = NONE
+                # A board can lose two chains at once, so its bitboards are redone
+                # from cells rather than updated chain by chain
+                captured_ids = np.unique(ids[capturing])
+                for color in (BLACK, WHITE):
+                    stones[color, captured_ids] = _to_bits(cells[captured_ids] == color, width)
+                num_captured += np.bincount(capturing[chain_nums], minlength=len(rows))
+                captured_at[capturing] = neighbors[capturing, touching_sides[dead]]
+
+            neighbor_values = cells[ids[:, None], neighbors]
+            num_liberties = (neighbor_values == NONE).sum(axis=1)
+            legal = np.ones(len(rows), dtype=bool)
+            # Without an empty neighbor or a capture, the move is suicide unless it
+            # joins a chain of ours with a liberty elsewhere
+            cramped = np.nonzero((num_liberties == 0) & (num_captured == 0))[0]
+            if len(cramped):
+                cramped_ids = ids[cramped]
+                legal[cramped] = ~_dead_chains(
+                    stones[movers[cramped], cramped_ids], self._empty_bits(cramped_ids), points[cramped], width,
+                )[0]
+                illegal = ~legal
+                cells[ids[illegal], points[illegal]] = NONE
+                stones[movers[illegal], ids[illegal], points[illegal] // width] &= ~point_bits[illegal]
+                candidates[rows[illegal], points[illegal]] = False
+                num_candidates[rows[illegal]] -= 1
+
+            # As in Board.play_index: ko after capturing one stone with a lone stone
+            # that's left with one liberty
+            is_ko = (
+                (num_captured == 1) & (num_liberties == 1) &
+                ~(neighbor_values == movers[:, None]).any(axis=1)
+            )
+            self.kos[ids[legal]] = np.where(is_ko, captured_at, 0)[legal]
+            placed[rows[legal]] = True
+
+        passed = active[~placed]
+        self.kos[passed] = 0
+        self.passes[active[placed]] = 0
+        self.passes[passed] += 1
+        self.players[active] = BLACK + WHITE - active_players
+        self.done |= self.passes >= 2
+        self.moves += 1
+        return True
+
+    def playout(self, rng=np.random):
+        while self.step(rng):
+            pass
+        return self
+
+    def area_scores(self, komi=0):
+        # Area (Tromp-Taylor) scores from black's point of view, one per board
+        black = self.cells == BLACK
+        white = self.cells == WHITE
+        empty = self.cells == NONE
+        reaches_black = _fill(_dilate(black, self.width), empty, self.width)
+        reaches_white = _fill(_dilate(white, self.width), empty, self.width)
+        return (
+            black.sum(axis=1) + (reaches_black & ~reaches_white).sum(axis=1) -
+            white.sum(axis=1) - (reaches_white & ~reaches_black).sum(axis=1) -
+            komi
+        )
+
+def random_playouts(board, num_playouts, komi=6.5, rng=np.random):
+    # Area scores of num_playouts random games continued from board
+    return Batch_Boards.from_boards([board], num_playouts).playout(rng).area_scores(komi)
+
+def evaluate_moves(board, playouts_per_move, komi=6.5, rng=np.random):
+    """ Flat Monte Carlo over every legal move of board, all in one batch.
+        Returns a list of (move index, win rate for the player to move), best first.
+    """
+    moves = list(board.legal_indices())
+    children = []
+    for move in moves:
+        child = board.copy(keep_history=False)
+        child.play_index(move)
+        children.append(child)
+    if not children:
+        return []
+    scores = Batch_Boards.from_boards(children, playouts_per_move).playout(rng).area_scores(komi)
+    wins = (scores > 0) if board.player == BLACK else (scores < 0)
+    win_rates = wins.reshape(len(moves), playouts_per_move).mean(axis=1)
+    return sorted(zip(moves, win_rates), key=(lambda (move, win_rate): -win_rate))
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+
+# Benchmarks for the bot's hot paths: game replay, move generation, coordinate
+# parsing, strategy move time and the API client (against mock_ogs, so no
+# network is needed). Every benchmark is seeded, so runs are comparable.
+#
+#   python bench.py --output results.json
+#   python bench.py --compare results.json   # exits 1 if anything got slower
+
+import gc
+import sys
+import json
+import random
+import argparse
+import platform
+from time import time
+
+import ogs_session
+import rate_limit
+import response_cache
+import mock_ogs
+import mcts
+import patterns
+from ogs_api import OGS_API_Agent
+from board import Coord, Board
+from strategies import Random_Strategy, MCTS_Strategy, Parallel_MCTS_Strategy
+
+SEED = 1234
+REPEAT = 5
+REGRESSION_THRESHOLD = 1.2 # flag anything more than 20% slower than the baseline
+
+BENCHMARKS = [] # (name, number of calls per repeat, setup function)
+
+def benchmark(name, number):
+    # Registers a setup function. It gets a seeded random.Random and returns the
+    # zero-argument callable to time.
+    def decorator(setup):
+        BENCHMARKS.append((name, number, setup))
+        return setup
+    return decorator
+
+class Bench_API_Agent(OGS_API_Agent):
+    # Talks to the mock server without needing config files or a real token
+    API_ROOT = None # set once the mock server is up
+    access_token = "bench"
+
+    def __init__(self, cache=None):
+        self.session = ogs_session.shared_session()
+        # By default nothing is cached, so the API benchmarks measure real round trips
+        self.cache = response_cache.Response_Cache(max_entries=0) if cache is None else cache
+
+    def log(self, *args):
+        pass
+
+_mock_server = None
+
+def mock_server():
+    global _mock_server
+    if _mock_server is None:
+        _mock_server = mock_ogs.Mock_OGS_Server(mock_ogs.Mock_OGS_State(num_listed_games=500)).start()
+        Bench_API_Agent.API_ROOT = _mock_server.api_root
+        # We're measuring the client, not the OGS rate limits
+        rate_limit.configure_shared_scheduler(rate=1e9, burst=1e9)
+    return _mock_server
+
+def random_game(game_id, size, num_moves, rng):
+    # A game in the API's JSON format, made of num_moves random legal moves
+    board = Board.empty_board(size)
+    moves = []
+    for move_num in xrange(num_moves):
+        idx = board.random_legal_index(rng, avoid_own_eyes=True)
+        if idx is None:
+            break
+        board.play_index(idx)
+        x, y = board.geometry.numeric(idx)
+        moves.append([x, y, 0])
+    return {"id": game_id, "width": size, "height": size, "gamedata": {"moves": moves}}
+
+@benchmark("board.from_game_api/19x19/300_moves", number=20)
+def bench_from_game_api(rng):
+    game = random_game(1, 19, 300, rng)
+    return lambda: Board.from_game_api(game)
+
+@benchmark("board.legal_coords/19x19/150_moves", number=200)
+def bench_legal_coords(rng):
+    board = Board.from_game_api(random_game(1, 19, 150, rng))
+    return board.legal_coords
+
+@benchmark("board.random_legal_move/19x19/150_moves", number=2000)
+def bench_random_legal_move(rng):
+    board = Board.from_game_api(random_game(1, 19, 150, rng))
+    return lambda: board.random_legal_move(rng)
+
+@benchmark("playout.light/19x19", number=20)
+def bench_light_playout(rng):
+    board = Board.empty_board(19)
+    return lambda: mcts.playout(board.copy(keep_history=False), rng)
+
+@benchmark("playout.patterns/19x19", number=20)
+def bench_pattern_playout(rng):
+    patterns.tables()
+    board = Board.empty_board(19)
+    return lambda: patterns.playout(board.copy(keep_history=False), rng)
+
+try:
+    import batch_playout
+except ImportError: # it needs numpy, which is optional
+    batch_playout = None
+
+if batch_playout is not None:
+    @benchmark("playout.batch/19x19/x1024", number=1)
+    def bench_batch_playout(rng):
+        # 1024 playouts at once; a 1024th of this is comparable with playout.light/19x19
+        # (on one core, about 4ms a playout against 8-10ms; with 256 boards, about 6.5ms)
+        numpy_rng = batch_playout.np.random.RandomState(rng.getrandbits(32))
+        board = Board.empty_board(19)
+        return lambda: batch_playout.random_playouts(board, 1024, rng=numpy_rng)
+
+@benchmark("coord.from_api/19x19/x361", number=50)
+def bench_coord_from_api(rng):
+    strings = [(cx, cy) for cx in Coord.API_STRINGS[19][0] for cy in Coord.API_STRINGS[19][1]]
+    def run():
+        for coord_str in strings:
+            Coord.from_api(19, coord_str)
+    return run
+
+@benchmark("coord.from_visual/19x19/x361", number=50)
+def bench_coord_from_visual(rng):
+    strings = [cx + cy for cx in Coord.VISUAL_STRINGS[19][0] for cy in Coord.VISUAL_STRINGS[19][1]]
+    def run():
+        for coord_str in strings:
+            Coord.from_visual(19, coord_str)
+    return run
+
+def _strategy_benchmark(strategy, rng, size, num_moves):
+    # Times strategy.play (including sending the move to the mock server) on a
+    # copy of the same mid-game position every call
+    server = mock_server()
+    game = random_game(strategy.game_id, size, num_moves, rng)
+    server.state.add_game(game)
+    board = Board.from_game_api(game)
+    return lambda: strategy.play(board.copy(), None)
+
+@benchmark("strategy.random/19x19", number=200)
+def bench_random_strategy(rng):
+    mock_server()
+    return _strategy_benchmark(Random_Strategy(1001, api=Bench_API_Agent()), rng, 19, 100)
+
+@benchmark("strategy.mcts/9x9/200_playouts", number=2)
+def bench_mcts_strategy(rng):
+    mock_server()
+    strategy = MCTS_Strategy(1002, seconds=None, playouts=200, api=Bench_API_Agent())
+    return _strategy_benchmark(strategy, rng, 9, 10)
+
+@benchmark("strategy.mcts_patterns/9x9/200_playouts", number=2)
+def bench_mcts_patterns_strategy(rng):
+    mock_server()
+    patterns.tables()
+    strategy = MCTS_Strategy(1003, seconds=None, playouts=200, api=Bench_API_Agent(), policy=patterns.playout)
+    return _strategy_benchmark(strategy, rng, 9, 10)
+
+def _parallel_mcts_benchmark(num_workers):
+    # The same total playout budget over num_workers processes, so comparing the
+    # entries shows how the root-parallel search scales
+    @benchmark("strategy.parallel_mcts/9x9/400_playouts/%d_workers"%num_workers, number=2)
+    def bench_parallel_mcts_strategy(rng):
+        mock_server()
+        strategy = Parallel_MCTS_Strategy(1004, seconds=None, playouts=400, num_workers=num_workers, api=Bench_API_Agent())
+        return _strategy_benchmark(strategy, rng, 9, 10)
+
+for num_workers in (1, 2, 4):
+    _parallel_mcts_benchmark(num_workers)
+
+@benchmark("api.get_all/500_records/sequential", number=5)
+def bench_get_all(rng):
+    mock_server()
+    agent = Bench_API_Agent()
+    return lambda: agent.get_all(agent.stub("games")).contents()
+
+@benchmark("api.get_all/500_records/parallel", number=5)
+def bench_get_all_parallel(rng):
+    mock_server()
+    agent = Bench_API_Agent()
+    return lambda: agent.get_all(agent.stub("games"), parallel=True).contents()
+
+@benchmark("api.get_game/19x19/revalidated", number=50)
+def bench_get_game_revalidated(rng):
+    # Polling an unchanged game: every call after the first is a 304
+    server = mock_server()
+    server.state.add_game(random_game(1003, 19, 200, rng))
+    agent = Bench_API_Agent(cache=response_cache.Response_Cache())
+    return lambda: agent.get_game(1003)
+
+def time_benchmark(name, number, setup, seed=SEED, repeat=REPEAT):
+    random.seed(seed) # strategies use the global generator
+    func = setup(random.Random(seed))
+    func() # warm up
+    per_call = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for repeat_num in xrange(repeat):
+            start = time()
+            for call_num in xrange(number):
+                func()
+            per_call.append((time() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    per_call.sort()
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best": per_call[0],
+        "median": per_call[len(per_call) // 2],
+        "mean": sum(per_call) / len(per_call),
+    }
+
+def run(names=None, seed=SEED, repeat=REPEAT):
+    global _mock_server
+    results = {}
+    try:
+        for name, number, setup in BENCHMARKS:
+            if names and not any(name.startswith(prefix) for prefix in names):
+                continue
+            results[name] = time_benchmark(name, number, setup, seed=seed, repeat=repeat)
+            print >>sys.stderr, "%-50s %10.3fms"%(name, 1000*results[name]["best"])
+    finally:
+        if _mock_server is not None:
+            # Drop our keep-alive connections first, so the server's handler threads
+            # finish now rather than during interpreter shutdown
+            ogs_session.shared_session().close()
+            _mock_server.stop()
+            _mock_server = None
+        if "parallel_search" in sys.modules:
+            sys.modules["parallel_search"].shutdown_pool()
+    return {
+        "meta": {
+            "seed": seed,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "time": time(),
+        },
+        "results": results,
+    }
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # Returns the names of benchmarks that got slower than threshold times the baseline
+    regressions = []
+    for name in sorted(current["results"]):
+        if name not in baseline["results"]:
+            continue
+        ratio = current["results"][name]["best"] / baseline["results"][name]["best"]
+        flag = " REGRESSION" if ratio > threshold else ""
+        print >>sys.stderr, "%-50s %6.2fx%s"%(name, ratio, flag)
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bot's hot paths")
+    parser.add_argument("--output", help="write the results (JSON) here instead of stdout")
+    parser.add_argument("--compare", help="baseline results (JSON) to compare against")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("names", nargs="*", help="only run benchmarks whose names start with these")
+    args = parser.parse_args(argv)
+
+    results = run(args.names, seed=args.seed, repeat=args.repeat)
+    if args.output:
+        with open(args.output, "w") as file_:
+            json.dump(results, file_, indent=2, sort_keys=True)
+    else:
+        print json.dumps(results, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as file_:
+            baseline = json.load(file_)
+        if compare(baseline, results):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
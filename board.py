@@ -0,0 +1,700 @@
+#!/usr/bin/env python
+
+import operator as ops
+import random
+
+import utils
+
+class Coord(object):
+    # Coords are flyweights: from_api, from_visual and from_numeric all hand out the
+    # one shared instance for each point of each board size, found in per-size dict
+    # tables (see Coord_Table), so they cost a dict lookup rather than a search
+    # through the strings and an allocation. They're immutable and hashable.
+    # Passes are Pass instances; see below.
+    __slots__ = ("size", "x", "y")
+    is_pass = False
+
+    API_STRINGS = {
+        9: ("abcdefghi", "abcdefghi"),
+        13: ("abcdefghijklm", "abcdefghijklm"),
+        19: ("abcdefghijklmnopqrs", "abcdefghijklmnopqrs"),
+    }
+    VISUAL_STRINGS = {
+        9: ("ABCDEFGHJ", map(str, range(9, 0, -1))),
+        13: ("ABCDEFGHJKLMN", map(str, range(13, 0, -1))),
+        19: ("ABCDEFGHJKLMNOPQRST", map(str, range(19, 0, -1))),
+    }
+    _tables = {} # size -> Coord_Table
+
+    @staticmethod
+    def table(size):
+        try:
+            return Coord._tables[size]
+        except KeyError:
+            return Coord._tables.setdefault(size, Coord_Table(size))
+
+    @classmethod
+    def from_api(klass, size, coord_str):
+        # coord_str is e.g. "dp" (or the pair of characters ("d", "p"))
+        by_api = klass.table(size).by_api
+        try:
+            return by_api[coord_str]
+        except (KeyError, TypeError):
+            try:
+                return by_api[tuple(coord_str)] # e.g. a list of characters
+            except KeyError:
+                raise ValueError("Bad API coordinate: %r"%(coord_str,))
+
+    @classmethod
+    def from_visual(klass, size, coord_str):
+        # coord_str is e.g. "D16" (or "d16")
+        try:
+            return klass.table(size).by_visual[coord_str]
+        except KeyError:
+            raise ValueError("Bad coordinate: %r"%(coord_str,))
+
+    @classmethod
+    def from_numeric(klass, size, xy):
+        # xy is an (x, y) pair; (-1, -1) is a pass
+        by_numeric = klass.table(size).by_numeric
+        try:
+            return by_numeric[xy]
+        except (KeyError, TypeError):
+            try:
+                return by_numeric[tuple(xy)] # e.g. a list straight from the API
+            except KeyError:
+                raise ValueError("Bad coordinate for a %dx%d board: %r"%(size, size, xy))
+
+    def __init__(self, size, x, y):
+        # Prefer the from_* constructors, which return the shared instances
+        self.size = size
+        self.x = x
+        self.y = y
+
+    def api_repr(self):
+        xs, ys = Coord.table(self.size).api_strings
+        return xs[self.x] + ys[self.y]
+
+    def visual_repr(self):
+        xs, ys = Coord.table(self.size).visual_strings
+        return xs[self.x] + ys[self.y]
+
+    def numeric_repr(self):
+        return self.x, self.y
+
+    def __eq__(self, other):
+        return self is other or (
+            isinstance(other, Coord) and
+            self.size == other.size and self.x == other.x and self.y == other.y
+        )
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __hash__(self):
+        return hash((self.size, self.x, self.y))
+
+    def __reduce__(self):
+        # Unpickle to the shared instance
+        return (_shared_coord, (self.size, (self.x, self.y)))
+
+    def __str__(self):
+        return self.visual_repr()
+
+class Pass(Coord):
+    # The pass move for a board size. Numerically it's (-1, -1), as in the API's
+    # move lists, so Game.play and friends handle it like any other move.
+    __slots__ = ()
+    is_pass = True
+
+    @classmethod
+    def for_size(klass, size):
+        return Coord.table(size).pass_
+
+    def __init__(self, size):
+        Coord.__init__(self, size, -1, -1)
+
+    def api_repr(self):
+        raise ValueError("A pass has no API coordinate; it's sent to the pass endpoint instead")
+
+    def visual_repr(self):
+        return "pass"
+
+
+def _shared_coord(size, xy):
+    return Coord.from_numeric(size, xy)
+
+class Coord_Table(object):
+    # Every Coord of one board size, indexed every way we look them up
+    __slots__ = ("size", "api_strings", "visual_strings", "by_numeric", "by_api", "by_visual", "pass_")
+
+    # For sizes without an entry in Coord.API_STRINGS/VISUAL_STRINGS
+    API_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+    VISUAL_LETTERS = "ABCDEFGHJKLMNOPQRSTUVWXYZ" # no I, by convention
+
+    def __init__(self, size):
+        self.size = size
+        self.api_strings = Coord.API_STRINGS.get(size) or (self.API_LETTERS[:size], self.API_LETTERS[:size])
+        self.visual_strings = Coord.VISUAL_STRINGS.get(size) or (
+            self.VISUAL_LETTERS[:size], map(str, range(size, 0, -1)),
+        )
+        self.pass_ = Pass(size)
+        self.by_numeric = {(-1, -1): self.pass_}
+        self.by_api = {}
+        self.by_visual = {}
+        api_xs, api_ys = self.api_strings
+        visual_xs, visual_ys = self.visual_strings
+        for y in xrange(size):
+            for x in xrange(size):
+                coord = Coord(size, x, y)
+                self.by_numeric[(x, y)] = coord
+                if x < len(api_xs) and y < len(api_ys):
+                    self.by_api[api_xs[x] + api_ys[y]] = coord
+                    self.by_api[(api_xs[x], api_ys[y])] = coord
+                if x < len(visual_xs):
+                    self.by_visual[visual_xs[x] + visual_ys[y]] = coord
+                    self.by_visual[visual_xs[x].lower() + visual_ys[y]] = coord
+
+class Board_Geometry(object):
+    # Per-size lookup tables shared by every Board of that size.
+    # Points are indices into a flat (size+2)x(size+2) array; the extra ring of
+    # BORDER cells around the edge means every on-board point has four in-range
+    # neighbors, and neighbors[idx] lists just the on-board ones.
+    # zobrist[color][idx] are the random keys XORed into a Board's hash for a stone
+    # of that color at idx; they're seeded by size so hashes agree across processes.
+    # coords[idx] is the (shared) Coord for each on-board point.
+    # pattern_offsets are the eight points around a point, in the order their cells
+    # appear in a 3x3 pattern code (see Board.patterns): row by row, top left first,
+    # two bits each. pattern_deltas[color] are what a stone of that color placed at
+    # idx adds to the codes of the points around it, as (offset from idx, amount).
+    __slots__ = ("size", "width", "points", "neighbors", "zobrist", "coords", "pattern_offsets", "pattern_deltas", "empty_patterns")
+    _cache = {}
+    ZOBRIST_WHITE_TO_MOVE = 0x5bd1e9955bd1e995
+
+    @classmethod
+    def for_size(klass, size):
+        try:
+            return klass._cache[size]
+        except KeyError:
+            return klass._cache.setdefault(size, klass(size))
+
+    def __init__(self, size):
+        self.size = size
+        self.width = width = size + 2
+        self.points = [self.index((x, y)) for y in xrange(size) for x in xrange(size)]
+        on_board = set(self.points)
+        self.neighbors = [()] * (width*width)
+        for idx in self.points:
+            self.neighbors[idx] = tuple(
+                nbr
+                for nbr in (idx - width, idx - 1, idx + 1, idx + width)
+                if nbr in on_board
+            )
+        rng = random.Random(size)
+        self.zobrist = [
+            [0] * (width*width) # NONE
+            for color in xrange(3)
+        ]
+        for color in (Board.BLACK, Board.WHITE):
+            for idx in self.points:
+                self.zobrist[color][idx] = rng.getrandbits(63) # stays a plain int on 64-bit builds
+        self.coords = [None] * (width*width)
+        for idx in self.points:
+            self.coords[idx] = Coord.from_numeric(size, self.numeric(idx))
+        self.pattern_offsets = (-width-1, -width, -width+1, -1, 1, width-1, width, width+1)
+        self.pattern_deltas = [
+            tuple((-offset, color << 2*direction) for direction, offset in enumerate(self.pattern_offsets))
+            for color in xrange(3)
+        ]
+        # Codes of an empty board; only the edge shows up in them
+        self.empty_patterns = [0] * (width*width)
+        for idx in self.points:
+            for direction, offset in enumerate(self.pattern_offsets):
+                if idx + offset not in on_board:
+                    self.empty_patterns[idx] |= Board.BORDER << 2*direction
+
+    def index(self, (x, y)):
+        return (y + 1)*self.width + x + 1
+
+    def numeric(self, idx):
+        y, x = divmod(idx, self.width)
+        return x - 1, y - 1
+
+class Board(object):
+    NONE = 0
+    BLACK = 1
+    WHITE = 2
+    BORDER = 3
+
+    # Stones are grouped into chains, each identified by one of its stones (its "head").
+    # chain[idx] is the head of the chain at idx (0 if empty), and the stones and
+    # liberties of each chain are kept up to date as moves are played, so captures
+    # and suicide checks never need a flood fill.
+    # stones_hash is the Zobrist hash of the stones alone, and history holds it for
+    # every position seen so far, for positional superko.
+    # empties lists the empty points in no particular order, and empty_pos[idx] is
+    # idx's position in it, so adding/removing/sampling an empty point is O(1).
+    # patterns[idx] encodes the eight cells around idx (see Board_Geometry) as a
+    # 16-bit 3x3 pattern code, kept up to date as stones come and go, for the
+    # pattern-based playout policy (see patterns).
+    # last_move is the point the previous move was played at, or 0 after a pass (or
+    # when unknown, e.g. for a board that was unpickled or built from rows).
+    __slots__ = (
+        "size", "geometry", "cells", "player",
+        "chain", "chain_stones", "chain_libs", "ko",
+        "stones_hash", "history",
+        "empties", "empty_pos",
+        "patterns", "last_move",
+    )
+
+    @classmethod
+    def empty_board(klass, size):
+        return klass(size)
+
+    @classmethod
+    def from_rows(klass, rows):
+        board = klass(len(rows))
+        assert all(board.size == len(r) for r in rows) # TODO: not an assert?
+        for y, row in enumerate(rows):
+            for x, entry in enumerate(row):
+                board.cells[board.geometry.index((x, y))] = entry
+        board._rebuild_chains()
+        return board
+
+    @classmethod
+    def from_game_api(klass, game):
+        # dirty_moves is directly from the API, unsanitized.
+        # it will be 0-based elements of the form [x, y, time] TODO: is this time? I assume it is
+        return Game.from_game_api(game).board
+
+    def __init__(self, size):
+        self.size = size
+        self.geometry = geometry = Board_Geometry.for_size(size)
+        self.cells = bytearray([self.BORDER]) * (geometry.width*geometry.width)
+        for idx in geometry.points:
+            self.cells[idx] = self.NONE
+        self.player = self.BLACK
+        self.chain = [0] * len(self.cells)
+        self.chain_stones = {}
+        self.chain_libs = {}
+        self.ko = 0 # the point that can't be retaken this turn, or 0 if none
+        self.stones_hash = 0
+        self.history = set([0])
+        self.empties = list(geometry.points)
+        self.empty_pos = [-1] * len(self.cells)
+        for pos, idx in enumerate(self.empties):
+            self.empty_pos[idx] = pos
+        self.patterns = list(geometry.empty_patterns)
+        self.last_move = 0
+
+    def copy(self, keep_history=True):
+        # Pass keep_history=False for throwaway copies (e.g. playouts) that don't need superko
+        res = object.__new__(self.__class__)
+        res.size = self.size
+        res.geometry = self.geometry
+        res.cells = bytearray(self.cells)
+        res.player = self.player
+        res.chain = list(self.chain)
+        res.chain_stones = {head: list(stones) for head, stones in self.chain_stones.iteritems()}
+        res.chain_libs = {head: set(libs) for head, libs in self.chain_libs.iteritems()}
+        res.ko = self.ko
+        res.stones_hash = self.stones_hash
+        res.history = set(self.history) if keep_history else set([self.stones_hash])
+        res.empties = list(self.empties)
+        res.empty_pos = list(self.empty_pos)
+        res.patterns = list(self.patterns)
+        res.last_move = self.last_move
+        return res
+
+    @property
+    def hash(self):
+        # Zobrist hash of the whole position, including the side to move
+        if self.player == self.WHITE:
+            return self.stones_hash ^ Board_Geometry.ZOBRIST_WHITE_TO_MOVE
+        return self.stones_hash
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.size == other.size and self.hash == other.hash
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __hash__(self):
+        return self.hash
+
+    # Compact pickling (e.g. for sending positions to worker processes): just the
+    # cells, side to move, ko and superko history. Chains and the empty-point list
+    # are rebuilt on the other end.
+    def __getstate__(self):
+        return (self.size, str(self.cells), self.player, self.ko, tuple(self.history))
+
+    def __setstate__(self, (size, cells, player, ko, history)):
+        self.__init__(size)
+        self.cells = bytearray(cells)
+        self._rebuild_chains()
+        self.player = player
+        self.ko = ko
+        self.history = set(history)
+
+    @property
+    def rows(self):
+        # Read-only 2D view, for compatibility with code written against the old list-of-rows Board
+        return [
+            [self.get((x, y)) for x in xrange(self.size)]
+            for y in xrange(self.size)
+        ]
+
+    def toggle_player(self):
+        if self.player == self.WHITE:
+            self.player = self.BLACK
+        elif self.player == self.BLACK:
+            self.player = self.WHITE
+        else:
+            assert False, "Internal"
+
+    def play(self, coord):
+        # Plays the given move (which may be a Pass) and toggles the current player (white <-> black)
+        if coord.is_pass:
+            self.pass_turn()
+        else:
+            self.play_index(self.geometry.index(coord.numeric_repr()))
+        return coord
+
+    def play_index(self, idx):
+        # Places a stone for the current player and removes any chains it captures.
+        # Doesn't check legality; see is_legal_index.
+        color = self.player
+        enemy = self.BLACK + self.WHITE - color
+        cells = self.cells
+        chain = self.chain
+        chain_libs = self.chain_libs
+        neighbors = self.geometry.neighbors[idx]
+
+        cells[idx] = color
+        self._remove_empty(idx)
+        self.stones_hash ^= self.geometry.zobrist[color][idx]
+        patterns = self.patterns
+        for offset, delta in self.geometry.pattern_deltas[color]:
+            patterns[idx + offset] += delta
+        chain[idx] = idx
+        self.chain_stones[idx] = [idx]
+        libs = chain_libs[idx] = set()
+        for nbr in neighbors:
+            if cells[nbr] == self.NONE:
+                libs.add(nbr)
+            else:
+                chain_libs[chain[nbr]].discard(idx)
+
+        captured = []
+        for nbr in neighbors:
+            value = cells[nbr]
+            if value == color:
+                if chain[nbr] != chain[idx]:
+                    self._merge_chains(chain[idx], chain[nbr])
+            elif value == enemy:
+                if not chain_libs[chain[nbr]]:
+                    captured.extend(self._remove_chain(chain[nbr]))
+
+        head = chain[idx]
+        if len(captured) == 1 and len(self.chain_stones[head]) == 1 and len(chain_libs[head]) == 1:
+            self.ko = captured[0]
+        else:
+            self.ko = 0
+        self.history.add(self.stones_hash)
+        self.last_move = idx
+        self.toggle_player()
+
+    def pass_turn(self):
+        self.ko = 0
+        self.last_move = 0
+        self.toggle_player()
+
+    def _merge_chains(self, head_a, head_b):
+        # Relabels the smaller chain, so merging is amortized O(log n) per stone
+        chain_stones = self.chain_stones
+        chain_libs = self.chain_libs
+        if len(chain_stones[head_a]) < len(chain_stones[head_b]):
+            head_a, head_b = head_b, head_a
+        stones_b = chain_stones.pop(head_b)
+        for stone in stones_b:
+            self.chain[stone] = head_a
+        chain_stones[head_a].extend(stones_b)
+        chain_libs[head_a] |= chain_libs.pop(head_b)
+        return head_a
+
+    def _remove_chain(self, head):
+        cells = self.cells
+        chain = self.chain
+        neighbors = self.geometry.neighbors
+        stones = self.chain_stones.pop(head)
+        del self.chain_libs[head]
+        keys = self.geometry.zobrist[cells[head]]
+        pattern_deltas = self.geometry.pattern_deltas[cells[head]]
+        patterns = self.patterns
+        stones_hash = self.stones_hash
+        for stone in stones:
+            cells[stone] = self.NONE
+            chain[stone] = 0
+            stones_hash ^= keys[stone]
+            self._add_empty(stone)
+            for offset, delta in pattern_deltas:
+                patterns[stone + offset] -= delta
+        self.stones_hash = stones_hash
+        for stone in stones:
+            for nbr in neighbors[stone]:
+                if chain[nbr]:
+                    self.chain_libs[chain[nbr]].add(stone)
+        return stones
+
+    def _add_empty(self, idx):
+        self.empty_pos[idx] = len(self.empties)
+        self.empties.append(idx)
+
+    def _remove_empty(self, idx):
+        # Swap idx with the last empty point, then drop it off the end
+        empties = self.empties
+        pos = self.empty_pos[idx]
+        last = empties.pop()
+        if last != idx:
+            empties[pos] = last
+            self.empty_pos[last] = pos
+        self.empty_pos[idx] = -1
+
+    def _rebuild_chains(self):
+        # Recomputes every chain from scratch with a flood fill; only needed after
+        # cells have been written directly.
+        cells = self.cells
+        neighbors = self.geometry.neighbors
+        self.chain = chain = [0] * len(cells)
+        self.chain_stones = {}
+        self.chain_libs = {}
+        self.ko = 0
+        zobrist = self.geometry.zobrist
+        self.stones_hash = reduce(ops.xor, (zobrist[cells[idx]][idx] for idx in self.geometry.points), 0)
+        self.history = set([self.stones_hash])
+        self.empties = [idx for idx in self.geometry.points if cells[idx] == self.NONE]
+        self.empty_pos = [-1] * len(cells)
+        for pos, idx in enumerate(self.empties):
+            self.empty_pos[idx] = pos
+        self.patterns = patterns = list(self.geometry.empty_patterns)
+        for idx in self.geometry.points:
+            if cells[idx] != self.NONE:
+                for offset, delta in self.geometry.pattern_deltas[cells[idx]]:
+                    patterns[idx + offset] += delta
+        self.last_move = 0
+        for start in self.geometry.points:
+            if cells[start] == self.NONE or chain[start]:
+                continue
+            color = cells[start]
+            stones = [start]
+            libs = set()
+            chain[start] = start
+            for stone in stones: # grows as we go
+                for nbr in neighbors[stone]:
+                    if cells[nbr] == self.NONE:
+                        libs.add(nbr)
+                    elif cells[nbr] == color and not chain[nbr]:
+                        chain[nbr] = start
+                        stones.append(nbr)
+            self.chain_stones[start] = stones
+            self.chain_libs[start] = libs
+
+    def set(self, xy, value):
+        # Writes a cell directly, without captures. Slow; prefer play.
+        self.cells[self.geometry.index(xy)] = value
+        self._rebuild_chains()
+
+    def get(self, xy):
+        return self.cells[self.geometry.index(xy)]
+
+    def liberties(self, xy):
+        idx = self.geometry.index(xy)
+        return len(self.chain_libs[self.chain[idx]]) if self.chain[idx] else 0
+
+    def legal_coords(self):
+        return list(self.legal_moves())
+
+    def legal_moves(self):
+        # Generates the legal moves (as Coords) for the current player
+        coords = self.geometry.coords
+        for idx in self.legal_indices():
+            yield coords[idx]
+
+    def legal_indices(self):
+        # Only empty points can be legal, so this scales with the number of empty
+        # points rather than the board area
+        is_legal_index = self.is_legal_index
+        for idx in self.empties:
+            if is_legal_index(idx):
+                yield idx
+
+    def random_legal_index(self, rng=random, avoid_own_eyes=False, weights=None):
+        # Picks a legal point uniformly at random, or returns None if there are none.
+        # Illegal candidates are swapped to the back of the window we sample from, so
+        # this is O(1) per candidate tried and usually only tries one or two.
+        # With avoid_own_eyes, points that are eyes for the current player are skipped
+        # too, which is what lets random playouts end. With weights (a table indexed
+        # by pattern code), points whose pattern has weight 0 are skipped.
+        empties = self.empties
+        empty_pos = self.empty_pos
+        patterns = self.patterns
+        num_candidates = len(empties)
+        while num_candidates:
+            pos = int(rng.random() * num_candidates)
+            idx = empties[pos]
+            if (self.is_legal_index(idx) and
+                not (avoid_own_eyes and self.is_eye_index(idx, self.player)) and
+                not (weights is not None and not weights[patterns[idx]])):
+                return idx
+            num_candidates -= 1
+            last = empties[num_candidates]
+            empties[pos], empties[num_candidates] = last, idx
+            empty_pos[last], empty_pos[idx] = pos, num_candidates
+        return None
+
+    def random_legal_move(self, rng=random):
+        # Returns a uniformly random legal Coord, or None if the only option is to pass
+        idx = self.random_legal_index(rng)
+        if idx is None:
+            return None
+        return self.geometry.coords[idx]
+
+    def is_legal(self, coord):
+        return self.is_legal_index(self.geometry.index(coord.numeric_repr()))
+
+    def is_legal_index(self, idx):
+        # A move is legal on an empty point (other than the ko point) unless it's suicide,
+        # i.e. unless it has no empty neighbor, doesn't connect to a friendly chain with
+        # another liberty, and doesn't capture anything. It also mustn't recreate an
+        # earlier position (positional superko), which we check by working out the
+        # resulting hash without playing the move.
+        cells = self.cells
+        if cells[idx] != self.NONE or idx == self.ko:
+            return False
+        chain = self.chain
+        chain_libs = self.chain_libs
+        color = self.player
+        zobrist = self.geometry.zobrist
+        enemy_keys = zobrist[self.BLACK + self.WHITE - color]
+        new_hash = self.stones_hash ^ zobrist[color][idx]
+        has_liberty = False
+        captured_heads = []
+        for nbr in self.geometry.neighbors[idx]:
+            value = cells[nbr]
+            if value == self.NONE:
+                has_liberty = True
+                continue
+            head = chain[nbr]
+            num_libs = len(chain_libs[head])
+            if value == color:
+                if num_libs > 1:
+                    has_liberty = True
+            elif num_libs == 1 and head not in captured_heads:
+                captured_heads.append(head)
+                for stone in self.chain_stones[head]:
+                    new_hash ^= enemy_keys[stone]
+        if not (has_liberty or captured_heads):
+            return False
+        return new_hash not in self.history
+
+    def is_eye_index(self, idx, color):
+        # Cheap one-point eye test: every neighbor is a stone of the given color
+        cells = self.cells
+        for nbr in self.geometry.neighbors[idx]:
+            if cells[nbr] != color:
+                return False
+        return True
+
+    def area_score(self, komi=0):
+        # Area (Tromp-Taylor) score from black's point of view: stones plus the empty
+        # regions that only reach one color, minus komi
+        cells = self.cells
+        neighbors = self.geometry.neighbors
+        counts = [0, 0, 0]
+        for idx in self.geometry.points:
+            counts[cells[idx]] += 1
+        seen = set()
+        for start in self.empties:
+            if start in seen:
+                continue
+            seen.add(start)
+            region = [start]
+            reaches = 0 # bitmask of BLACK and WHITE
+            for idx in region: # grows as we go
+                for nbr in neighbors[idx]:
+                    value = cells[nbr]
+                    if value == self.NONE:
+                        if nbr not in seen:
+                            seen.add(nbr)
+                            region.append(nbr)
+                    else:
+                        reaches |= value
+            if reaches == self.BLACK or reaches == self.WHITE:
+                counts[reaches] += len(region)
+        return counts[self.BLACK] - counts[self.WHITE] - komi
+
+    def _all_coords(self):
+        coords = self.geometry.coords
+        for idx in self.geometry.points:
+            yield coords[idx]
+
+    @utils.pipeto("\n".join)
+    def __str__(self):
+        size = self.size
+        symbols = {self.BLACK: "B", self.WHITE: "W", self.NONE: "+"}
+        yield "  ABCDEFGHJKLMNOPQRST"[:size+2]
+        for i, row in enumerate(self.rows):
+            yield "%2d"%(size-i) + "".join(map(lambda entry: symbols[entry], row))
+        yield "--------------"
+        yield "current player: %s"%symbols[self.player]
+        yield "--------------"
+
+class Game(object):
+    # A Board plus the list of moves that produced it, so we can catch up with the
+    # API by applying only the moves after the last one we know about, rather than
+    # replaying the whole game from an empty board every time.
+
+    @classmethod
+    def from_game_api(klass, game):
+        res = klass(game["width"])
+        res.sync(game)
+        return res
+
+    def __init__(self, size):
+        self.size = size
+        self.board = Board.empty_board(size)
+        self.moves = [] # (x, y) pairs, (-1, -1) for a pass
+
+    @property
+    def move_number(self):
+        return len(self.moves)
+
+    def play(self, coord):
+        self._apply(coord.numeric_repr())
+
+    def _apply(self, (x, y)):
+        if x < 0 or y < 0: # pass
+            self.board.pass_turn()
+        else:
+            self.board.play_index(self.board.geometry.index((x, y)))
+        self.moves.append((x, y))
+
+    def sync(self, game):
+        # Brings us up to date with a game from the API.
+        # Returns True if we were consistent with it (so only new moves were applied),
+        # or False if we had diverged and had to rebuild from scratch.
+        api_moves = game["gamedata"]["moves"]
+        num_known = len(self.moves)
+        # Every move we know must match, not just the last one (comparing the lists
+        # is still far cheaper than replaying them)
+        consistent = (
+            len(api_moves) >= num_known and
+            [tuple(move[:2]) for move in api_moves[:num_known]] == self.moves
+        )
+        if not consistent:
+            self.board = Board.empty_board(self.size)
+            self.moves = []
+            num_known = 0
+        for move in api_moves[num_known:]:
+            self._apply(tuple(move[:2]))
+        return consistent
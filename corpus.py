@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# Bulk loading of SGF collections: files (or directories of them) are spread
+# over a process pool, each worker memory-maps its file and streams the games out
+# of the mapping with sgf.iter_games, so even collections of hundreds of
+# thousands of games are never read into memory whole, and the parsing and
+# replaying runs on every core.
+#
+# map_files applies a function to each file's games in the workers and hands the
+# (small) per-file results back, so the heavy lifting never crosses a process
+# boundary.
+
+import os
+import mmap
+import functools
+import multiprocessing
+
+import sgf
+
+SGF_EXTENSIONS = (".sgf", ".sgfs")
+
+def find_sgf_files(paths):
+    # The SGF files in paths, which may be files or directories (searched recursively)
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(SGF_EXTENSIONS):
+                        yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+def map_file(func, path):
+    """ Returns func(path, games), where games streams the Sgf_Games in the file """
+    with open(path, "rb") as file_:
+        if os.fstat(file_.fileno()).st_size == 0:
+            return func(path, iter([]))
+        data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return func(path, sgf.iter_games(data))
+    finally:
+        data.close()
+
+def map_files(func, paths, num_workers=None, chunksize=8):
+    """ Yields func(path, games) for every SGF file under paths, in no particular
+        order. func runs in the worker processes, so it has to be picklable (i.e. a
+        module-level function, or a functools.partial of one). num_workers=1 runs
+        everything in this process.
+    """
+    files = list(find_sgf_files(paths))
+    if num_workers == 1 or len(files) <= 1:
+        for path in files:
+            yield map_file(func, path)
+        return
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        for result in pool.imap_unordered(functools.partial(map_file, func), files, chunksize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+class Replay_Stats(object):
+    def __init__(self, num_files=0, num_games=0, num_moves=0, errors=()):
+        self.num_files = num_files
+        self.num_games = num_games
+        self.num_moves = num_moves
+        self.errors = list(errors) # (path, game number, move number, description)
+
+    def add(self, other):
+        self.num_files += other.num_files
+        self.num_games += other.num_games
+        self.num_moves += other.num_moves
+        self.errors.extend(other.errors)
+
+    def __str__(self):
+        return "%d files, %d games, %d moves, %d errors"%(
+            self.num_files, self.num_games, self.num_moves, len(self.errors),
+        )
+
+def replay_file(path, games):
+    # Replays every game into a Board, checking each move is legal
+    stats = Replay_Stats(num_files=1)
+    for game_num, game in enumerate(games):
+        stats.num_games += 1
+        try:
+            for move_num, (board, color, idx) in enumerate(game.replay()):
+                if idx is not None and not board.is_legal_index(idx):
+                    stats.errors.append((path, game_num, move_num, "illegal move"))
+                    break
+                stats.num_moves += 1
+        except Exception as e:
+            stats.errors.append((path, game_num, None, repr(e)))
+    return stats
+
+def replay(paths, num_workers=None):
+    """ Replays every game in the SGF files under paths, as a regression test for
+        the parser and Board. Returns a Replay_Stats.
+    """
+    total = Replay_Stats()
+    for stats in map_files(replay_file, paths, num_workers):
+        total.add(stats)
+    return total
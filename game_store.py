@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+# A local SQLite store of the games we've fetched, so a restart doesn't have to
+# refetch (and replay) everything. Each game keeps its listing record, its moves
+# packed two bytes per move, and a pickled Board for the position after them, so
+# loading a game is an unpickle rather than a replay. sync() brings the store up
+# to date with the API by only fetching what's new or still changing.
+
+import json
+import sqlite3
+import cPickle
+import threading
+import itertools as itt
+from time import time
+
+from board import Game
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    black_id INTEGER,
+    white_id INTEGER,
+    state TEXT NOT NULL,          -- "waiting", "play" or "finished"
+    started TEXT,
+    ended TEXT,
+    record TEXT NOT NULL,         -- the listing record (JSON), without gamedata
+    num_moves INTEGER NOT NULL DEFAULT 0,
+    moves BLOB,                   -- see pack_moves
+    position BLOB,                -- pickled Board after num_moves moves
+    fetched REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_black ON games (black_id, state);
+CREATE INDEX IF NOT EXISTS games_by_white ON games (white_id, state);
+CREATE INDEX IF NOT EXISTS games_by_state ON games (state, started);
+"""
+
+def pack_moves(moves):
+    # (x, y) pairs -> two bytes per move, each coordinate offset by one so that a
+    # pass (-1, -1) packs to zeros
+    return bytearray(itt.chain.from_iterable((x + 1, y + 1) for x, y in moves))
+
+def unpack_moves(packed):
+    packed = bytearray(packed or "")
+    return [(packed[i] - 1, packed[i+1] - 1) for i in xrange(0, len(packed), 2)]
+
+def game_state(record):
+    gamedata = record.get("gamedata") or {}
+    if record.get("ended") or gamedata.get("phase") == "finished":
+        return "finished"
+    elif record.get("started") or gamedata.get("moves"):
+        return "play"
+    else:
+        return "waiting"
+
+def _player_id(record, color):
+    players = record.get("players") or {}
+    player = players.get(color)
+    if player is not None:
+        return player["id"]
+    return record.get(color) # some endpoints give the bare id
+
+class Game_Store(object):
+    def __init__(self, path="games.sqlite3"):
+        self.path = path
+        # Game_Manager saves from its worker threads; the lock serializes them
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _listing_row(self, record, now):
+        listing = dict((key, val) for key, val in record.iteritems() if key != "gamedata")
+        return (
+            record["id"],
+            record["width"],
+            record["height"],
+            _player_id(record, "black"),
+            _player_id(record, "white"),
+            game_state(record),
+            record.get("started"),
+            record.get("ended"),
+            json.dumps(listing),
+            now,
+        )
+
+    def ingest_listing(self, records):
+        # Upserts listing records (e.g. from /games/ or me/games) in one transaction,
+        # keeping any moves we already have
+        now = time()
+        rows = [self._listing_row(record, now) for record in records]
+        with self.lock, self.conn:
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO games (id, width, height, black_id, white_id, state, started, ended, record, fetched)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            self.conn.executemany("""
+                UPDATE games SET width=?, height=?, black_id=?, white_id=?, state=?, started=?, ended=?, record=?, fetched=?
+                WHERE id=?
+            """, [row[1:] + row[:1] for row in rows])
+
+    def ingest_games(self, games):
+        # Stores full game records (as returned by games/<id>), moves and all, in one
+        # transaction. games may also be (record, Game) pairs, to reuse a position
+        # that's already been replayed.
+        now = time()
+        rows = []
+        for item in games:
+            record, game = item if isinstance(item, tuple) else (item, None)
+            if game is None:
+                game = self._replay(record)
+            listing_row = self._listing_row(record, now)
+            rows.append(listing_row + (
+                len(game.moves),
+                buffer(pack_moves(game.moves)),
+                buffer(cPickle.dumps(game.board, cPickle.HIGHEST_PROTOCOL)),
+            ))
+        with self.lock, self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO games
+                    (id, width, height, black_id, white_id, state, started, ended, record, fetched, num_moves, moves, position)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+    def save_game(self, record, game=None):
+        self.ingest_games([(record, game)])
+
+    def _replay(self, record):
+        # Replays a full game record, starting from what we already have stored
+        game = self.load_game(record["id"]) or Game(record["width"])
+        game.sync(record)
+        return game
+
+    def load_game(self, game_id):
+        # Returns the stored Game (position and moves), or None if we don't have it
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT width, moves, position FROM games WHERE id=? AND position IS NOT NULL", (game_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        game = Game(row["width"])
+        game.board = cPickle.loads(str(row["position"]))
+        game.moves = unpack_moves(row["moves"])
+        return game
+
+    def get_game(self, game_id):
+        # The stored game in the API's format (move times aren't kept), or None
+        with self.lock:
+            row = self.conn.execute("SELECT record, moves FROM games WHERE id=?", (game_id,)).fetchone()
+        if row is None:
+            return None
+        record = json.loads(row["record"])
+        record["gamedata"] = {"moves": [[x, y, 0] for x, y in unpack_moves(row["moves"])]}
+        return record
+
+    def iter_games(self, state=None, size=None):
+        # Yields (listing record, moves) for every stored game with moves, optionally
+        # only those in the given state and/or of the given size
+        query = "SELECT record, moves FROM games WHERE num_moves > 0"
+        args = []
+        if state is not None:
+            query += " AND state=?"
+            args.append(state)
+        if size is not None:
+            query += " AND width=? AND height=?"
+            args.extend([size, size])
+        with self.lock:
+            rows = self.conn.execute(query, args).fetchall()
+        for row in rows:
+            yield json.loads(row["record"]), unpack_moves(row["moves"])
+
+    def current_games(self, player_id):
+        # Like OGS_API_Agent.get_my_current_games, for the given player, without the network
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT record FROM games WHERE black_id=? AND state='play'
+                UNION ALL
+                SELECT record FROM games WHERE white_id=? AND state='play'
+            """, (player_id, player_id)).fetchall()
+        games = [json.loads(row["record"]) for row in rows]
+        return sorted(games, key=(lambda game: game.get("started")))
+
+    def game_ids(self, state=None):
+        with self.lock:
+            if state is None:
+                rows = self.conn.execute("SELECT id FROM games").fetchall()
+            else:
+                rows = self.conn.execute("SELECT id FROM games WHERE state=?", (state,)).fetchall()
+        return set(row["id"] for row in rows)
+
+    def max_game_id(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM games").fetchone()[0]
+
+    def sync(self, api):
+        # Brings the store up to date with our games on the server, fetching
+        # only deltas: listings newer than anything we have, plus the full records of
+        # games that are (or until now were) in progress. Finished games we already
+        # have are never refetched. Returns the ids of the games that were fetched.
+        newest_known = self.max_game_id()
+        new_games = itt.takewhile(
+            (lambda record: record["id"] > newest_known),
+            api.siter("me/games", params={"ordering": "-id"}),
+        )
+        self.ingest_listing(list(new_games))
+
+        active = api.sget(
+            "me/games",
+            all=True,
+            parallel=True,
+            params={"started__isnull": False, "ended__isnull": True},
+        )
+        self.ingest_listing(active)
+
+        # Anything we thought was in progress but isn't listed anymore has ended
+        to_fetch = set(record["id"] for record in active) | self.game_ids("play")
+        self.ingest_games(api.get_game(game_id) for game_id in sorted(to_fetch))
+        return to_fetch
@@ -1,403 +1,60 @@
 #!/usr/bin/env python
 
-from pprint import pprint
-import utils
-import os
-from time import sleep
-import operator as ops
-import copy
-import random
-
-import requests
-from urllib import urlencode
-
-class OGS_API_Agent(object):
-    def __init__(self):
-        self.access_token = self.load_access_token()
-        self.ensure_config_files_exist()
-
-    @classmethod
-    def ensure_config_files_exist(klass):
-        for path in [
-                "gobot_user.cfg",
-                "client.cfg",
-            ]:
-            if not os.path.exists(path):
-                raise Exception, "You are missing some config files (specifically, ./%s)"%path
-
-    @classmethod
-    def stub(klass, api_endpoint):
-        return "https://online-go.com/api/v1/%s/"%api_endpoint.strip("/")
-
-    @classmethod
-    def load_access_token(klass):
-        if os.path.exists("access_token.txt"):
-            return utils.file_to_string("access_token.txt")
-        else:
-            # Generate and cache the token
-            # TODO: the token expires after a year
-            token = klass._generate_access_token()
-            with open("access_token.txt", "w") as file_:
-                file_.write(token)
-            return token
-
-    @classmethod
-    def _generate_access_token(klass, user_file="gobot_user.cfg"):
-        print "Generating a new access token..."
-
-        # 1) Prepare parameters
-        url = "https://online-go.com/oauth2/access_token"
-
-        # Important: the files we read here should NOT be checked into source-control (e.g. git).
-        # You'll have to create them yourself and add them to your .gitignore file
-        # That's why we're reading them from local files, rather than having them be hard-coded strings
-        client_config = utils.config_as_dict("client.cfg")["values"]
-        user_config = utils.config_as_dict(user_file)["values"]
-        values = urlencode({
-            "client_id":     client_config["id"], # generated on https://online-go.com/developer
-            "client_secret": client_config["secret"], # generated on https://online-go.com/developer
-            "grant_type":    "password",
-            "username":      user_config["username"], # contains your username
-            "password":      user_config["app_specific_password"], # generated on your user settings page
-        }) # TODO: document this better, probably with an example file or two
-
-        headers = {
-          'Content-Type': 'application/x-www-form-urlencoded'
-        }
-
-        # 2) Send request
-        response = requests.post(url, data=values, headers=headers)
-
-        # 3) Read response
-        return utils.Either.from_response(response).fmap_right(
-            (lambda value: value["access_token"])
-        ).contents()
-
-    def log(self, msg):
-        print msg
-
-    def basic_headers(self):
-        return {
-            "Authorization": "Bearer %s"%self.access_token,
-        }
-
-    def get(self, url, params={}, headers={}):
-        # 1) Prepare parameters
-        if params:
-            url = "{}?{}".format(url, urlencode(params))
-        headers = utils.dict_merge(
-            self.basic_headers(),
-            headers,
-        )
-
-        self.log("GET:\n\turl={}\n\theaders={}".format(repr(url), repr(headers)))
-
-        # 2) Send request
-        response = requests.get(url, headers=headers)
-
-        # 3) Read response
-        return utils.Either.from_response(response)
-
-    def post(self, url, data, params={}, headers={}):
-        # 1) Prepare parameters
-        if params:
-            url = "{}?{}".format(url, urlencode(params))
-        headers = utils.dict_merge(
-            self.basic_headers(),
-            headers,
-        )
-
-        self.log("POST:\n\turl={}\n\tdata={}\n\theaders={}".format(repr(url), repr(data), repr(headers)))
-
-        # 2) Send request
-        response = requests.post(url, data=data, headers=headers)
-
-        # 3) Read response
-        return utils.Either.from_response(response)
-
-    # Convinience / testing functions
-    def sget(self, url_stub, all=False, *args, **kwargs):
-        if all:
-            return self.get_all(self.stub(url_stub), *args, **kwargs).contents()
-        else:
-            return self.get(self.stub(url_stub), *args, **kwargs).fmap_left(
-                (lambda resp: "Request failed: %s"%resp.text)
-            ).contents()
-
-    def spost(self, url_stub, *args, **kwargs):
-        return self.post(self.stub(url_stub), *args, **kwargs).fmap_left(
-            (lambda resp: "Request failed: %s"%resp.text)
-        ).contents()
-
-    def get_all(self, url, params={}, headers={}, LIMIT=1000):
-        data = self.get(url, params=params, headers=headers)
-        if data["count"] > LIMIT:
-            return utils.Either(False, "You are not allowed to retrieve more than %d records at once"%LIMIT)
-        else:
-            aggregate = copy.copy(data["results"])
-            while data["next"]:
-                next_url = data["next"]
-                data = self.get(next_url, headers=headers) # TODO: include headers here?
-                aggregate.extend(data["results"])
-            return utils.Either(True, aggregate)
-
-    @classmethod
-    def sort_key(klass, fields):
-        return lambda game: map(lambda field: ops.itemgetter(field)(game), fields)
-
-    @classmethod
-    def sort_map(klass, game_list, fields):
-        key = klass.sort_key(fields)
-        return map(key, sorted(games, key=key))
-
-    def get_game(self, game_id):
-        return self.sget("games/%d"%game_id)
-
-    def get_game_ids_where_its_my_turn(self):
-        # TODO: delete? / reorganize somewhere
-
-        # notifications = self.sget(
-        #     "me/notifications",
-        #     params={"type": "yourMove"},
-        # ) # TODO: report this bug; me/notifiations ignores params entirely it seems
-        notifications = self.sget("me/notifications")
-
-        return [
-            notif["game_id"]
-            for notif in notifications
-            if notif["type"] == "yourMove"
-        ]
-
-    def get_my_current_games(self):
-        # TODO: delete? / reorganize somewhere
-        games = self.sget(
-            "me/games",
-            all=True,
-            params={
-                "started__isnull": False,
-                "ended__isnull": True,
-            },
-        )
-        return sorted(games, key=self.sort_key(("started",)))
-
-# TODO: add a Move = Coord | Pass datatype?
-class Coord(object):
-    API_STRINGS = {
-        9: ("abcdefghi", "abcdefghi"),
-        13: ("abcdefghijklm", "abcdefghijklm"),
-        19: ("abcdefghijklmnopqrs", "abcdefghijklmnopqrs"),
-    }
-    VISUAL_STRINGS = {
-        9: ("ABCDEFGHJ", map(str, range(9, 0, -1))),
-        13: ("ABCDEFGHJKLMN", map(str, range(13, 0, -1))),
-        19: ("ABCDEFGHJKLMNOPQRST", map(str, range(19, 0, -1))),
-    }
-
-    @classmethod
-    def from_api(klass, size, (cx, cy)):
-        return klass(size,
-            klass.API_STRINGS[size][0].index(cx),
-            klass.API_STRINGS[size][1].index(cy)
-        )
-
-    @classmethod
-    def from_visual(klass, size, coord_str):
-        if len(coord_str) not in [2, 3]:
-            raise Exception, "Bad length coord_str"
-        cx, cy = coord_str[0], coord_str[1:]
-        return klass(size,
-            klass.VISUAL_STRINGS[size][0].index(cx.upper()),
-            klass.VISUAL_STRINGS[size][1].index(cy)
-        )
-
-    @classmethod
-    def from_numeric(klass, size, (cx, cy)):
-        return klass(size, cx, cy)
-
-    def __init__(self, size, x, y):
-        self.size = size
-        self.x = x
-        self.y = y
-
-    def api_repr(self):
-        return "%s%s"%(
-            self.API_STRINGS[self.size][0][self.x],
-            self.API_STRINGS[self.size][1][self.y],
-        )
-
-    def visual_repr(self):
-        return "%s%s"%(
-            self.VISUAL_STRINGS[self.size][0][self.x],
-            self.VISUAL_STRINGS[self.size][1][self.y],
-        )
-
-    def numeric_repr(self):
-        return self.x, self.y
-
-    def __eq__(self, other):
-        return self.size == other.size and self.numeric_repr() == other.numeric_repr()
-
-    def __ne__(self, other):
-        return not (self == other)
-
-    __str__ = visual_repr
-
-class Board(object):
-    NONE = 0
-    BLACK = 1
-    WHITE = 2
-
-    @classmethod
-    def empty_board(klass, size):
-        rows = []
-        for i in xrange(size):
-            rows.append([klass.NONE]*size)
-        return klass(rows)
-
-    @classmethod
-    def from_game_api(klass, game):
-        # dirty_moves is directly from the API, unsanitized.
-        # it will be 0-based elements of the form [x, y, time] TODO: is this time? I assume it is
-        board = klass.empty_board(game["width"])
-        for x, y, time in game["gamedata"]["moves"]:
-            board.play(Coord.from_numeric(board.size, (x, y)))
-        return board
-
-    def __init__(self, rows):
-        self.rows = rows
-        self.size = len(rows)
-        assert all(self.size == len(r) for r in rows) # TODO: not an assert?
-        self.player = self.BLACK
-
-    def toggle_player(self):
-        if self.player == self.WHITE:
-            self.player = self.BLACK
-        elif self.player == self.BLACK:
-            self.player = self.WHITE
-        else:
-            assert False, "Internal"
-
-    def play(self, coord):
-        # Plays the given move and toggles the current player (white <-> black)
-        self.set(coord.numeric_repr(), self.player)
-        self.toggle_player()
-        return coord
-
-    def set(self, (x, y), value):
-        self.rows[y][x] = value
-
-    def get(self, (x, y)):
-        return self.rows[y][x]
-
-    def legal_coords(self):
-        return filter(self.is_legal, self._all_coords())
-
-    def is_legal(self, coord):
-        # TODO: implement properly
-        return self.get(coord.numeric_repr()) == self.NONE
-
-    def _all_coords(self):
-        for rr, row in enumerate(self.rows):
-            for cc, entry in enumerate(row):
-                yield Coord.from_numeric(self.size, (rr, cc))
-
-    @utils.pipeto("\n".join)
-    def __str__(self):
-        size = len(self.rows)
-        symbols = {self.BLACK: "B", self.WHITE: "W", self.NONE: "+"}
-        yield "  ABCDEFGHJKLMNOPQRST"[:size+2]
-        for i, row in enumerate(self.rows):
-            yield "%2d"%(size-i) + "".join(map(lambda entry: symbols[entry], row))
-        yield "--------------"
-        yield "current player: %s"%symbols[self.player]
-        yield "--------------"
-
-class Go_Strategy(object):
-    # TODO: look into making this an ABC maybe: https://docs.python.org/2/library/abc.html
-    def play(self, board):
-        # Board -> Either(Move)
-        raise NotImplementedError( "Should have implemented this" )
-
-class Always_Pass(Go_Strategy):
-    def play(self, board):
-        # TODO: s/Coord(...)/Pass()
-        return utils.Either(True, Coord.from_numeric(board.size, (-1, -1)))
-
-class OGS_Reciever_Strategy(Go_Strategy):
-    def __init__(self, game_id):
-        super(self.__class__, self).__init__()
-        self.game_id = game_id
-        self.api = OGS_API_Agent()
-
-    def play(self, board, last_move):
-        POLL_PERIOD = 5
-        MAX_POLL_ATTEMPTS = 10
-        for attempt_num in xrange(MAX_POLL_ATTEMPTS):
-            self.api.log("Poll attempt #%d..."%attempt_num)
-            game = self.api.get_game(self.game_id)
-
-            x, y, time = game["gamedata"]["moves"][-1]
-            coord = Coord.from_numeric(board.size, (x, y))
-
-            if last_move != coord:
-                print "Recieved opponent's move:", coord
-                return utils.Either(True, coord)
-            sleep(POLL_PERIOD)
-        return utils.Either(False, "Gave up polling for opponent response")
-
-class OGS_Sender_Strategy(Go_Strategy):
-    def __init__(self, game_id):
-        self.game_id = game_id
-        self.api = OGS_API_Agent()
-
-    def send_move(self, coord):
-        self.api.spost("games/%d/move"%self.game_id,
-            data='{"move": "%s"}'%coord.api_repr(),
-            headers={"Content-Type": "application/json"}
-        )
-
-    def send_pass(self):
-        self.api.spost("games/%d/pass"%self.game_id,
-            data="",
-            headers={"Content-Type": "application/json"}
-        )
-
-class User_Input_Strategy(OGS_Sender_Strategy):
-    def __init__(self, game_id):
-        super(self.__class__, self).__init__(game_id)
-
-    def play(self, board, last_move):
-        print board
-        inp = raw_input("> ")
-        if inp in ["p", "pass"]:
-            self.send_pass()
-            # TODO: return Pass()
-            return utils.Either(True, Coord.from_numeric(board.size, (-1, 1)))
-        else:
-            coord = Coord.from_visual(board.size, inp)
-            self.send_move(coord)
-            return utils.Either(True, coord)
-
-class Random_Strategy(OGS_Sender_Strategy):
-    def __init__(self, game_id):
-        super(self.__class__, self).__init__(game_id)
-
-    def play(self, board, last_move):
-        legal = board.legal_coords()
-        # print "legal moves: {}".format(map(str, legal))
-        if legal:
-            coord = random.choice(list(legal))
-            # print "randomly chose {}".format(coord)
-            self.send_move(coord)
-            return utils.Either(True, coord)
-        else:
-            # TODO: return Pass()
-            self.send_pass()
-            return utils.Either(True, Coord.from_numeric(board.size, (-1, 1)))
-
+# Command line entry point for the bot. The library itself lives in:
+#   ogs_api    - OGS_API_Agent, the online-go.com REST client
+#   board      - Coord, Board and Game
+#   strategies - Go_Strategy and its implementations
+#   play       - play_game, play_ogs_game and Game_Manager
+# None of them touch the network or config files at import time, and requests
+# isn't loaded until the first HTTP call. Everything is re-exported here for
+# code that still does "from main import ...".
 
+import os
+import sys
+import atexit
+import logging
+import argparse
+import functools
+import subprocess
+from pprint import pprint
 
-def print_current_interesting_games():
+import utils
+import ogs_metrics
+import sgf
+import corpus
+import opening_book
+import patterns
+from game_store import Game_Store
+from ogs_api import OGS_API_Agent, shared_agent
+from board import Coord, Pass, Board_Geometry, Board, Game
+from strategies import (
+    Go_Strategy,
+    Always_Pass,
+    OGS_Reciever_Strategy,
+    OGS_Realtime_Reciever_Strategy,
+    OGS_Sender_Strategy,
+    User_Input_Strategy,
+    Random_Strategy,
+    MCTS_Strategy,
+    Parallel_MCTS_Strategy,
+)
+from play import play_turn, play_game, play_ogs_game, Game_Manager
+
+LIBRARY_MODULES = ("ogs_api", "board", "strategies", "play")
+IMPORT_TIME_BUDGET = 0.05 # seconds; how long a fresh (e.g. worker) process may spend importing the library
+IMPORT_TIME_REPEAT = 5 # fresh interpreters to time; the best one is compared with the budget
+
+STRATEGIES = {
+    "random": Random_Strategy,
+    "mcts": MCTS_Strategy,
+    "parallel-mcts": Parallel_MCTS_Strategy,
+    "mcts-patterns": functools.partial(MCTS_Strategy, policy=patterns.playout),
+    "parallel-mcts-patterns": functools.partial(Parallel_MCTS_Strategy, policy=patterns.playout),
+    "user": User_Input_Strategy,
+    "pass": Always_Pass,
+}
+
+def print_current_interesting_games(count=100):
     MINUTES = 60
     HOURS = 60*MINUTES
     DAYS = 24*HOURS
@@ -407,9 +64,9 @@ def print_current_interesting_games():
     BLITZ_CUTOFF = 20 # Any game with less than a 20 seconds per move on average is considered "blitz"
 
 
-    agent = OGS_API_Agent()
-    games = agent.get_all(
-        agent.stub("/games/"),
+    agent = shared_agent()
+    games = agent.siter(
+        "/games/",
         params={
             "started__isnull": False,
             "ended__isnull": True,
@@ -429,7 +86,7 @@ def print_current_interesting_games():
         "black_player_rank",
         "id",
     )
-    pprint(agent.sort_by(games, sort_fields))
+    pprint(agent.top_k(games, count, sort_fields))
 
 def tapprint(msg, continuation):
     def res(*args, **kwargs):
@@ -437,46 +94,114 @@ def tapprint(msg, continuation):
         return continuation(*args, **kwargs)
     return res
 
-def play_game(p1, p2, fetch_board):
-    # assumes p1 will go first
-    board = fetch_board()
-    e_p2_move = utils.Either(True, None)
-    while True:
-        e_p1_move = p1.play(board, e_p2_move.contents())
-        if type(e_p1_move) != type(utils.Either(True, 0)):
-            raise Exception, "Bad return type from Go_Strategy interface; must return an Either"
-        # TODO: also enforce that board has one new move... another reason to make a Game() object
-        print "Got p1's move: {}".format(e_p1_move.contents())
-
-        # TODO: replace with if board != fetch_board(): raise Error
-        board = fetch_board()
-
-        e_p2_move = p2.play(board, e_p1_move.contents())
-        if type(e_p1_move) != type(utils.Either(True, 0)): # TODO: this is ugly
-            raise Exception, "Bad return type from Go_Strategy interface; must return an Either"
-        # TODO: also enforce that board has one new move... another reason to make a Game() object
-        print "Got p2's move: {}".format(e_p2_move.contents())
-
-        # TODO: replace with if board != fetch_board(): raise Error
-        board = fetch_board()
-
-        # TODO: end if both pass
-
-def play_ogs_game(gid, p1, p2):
-    # TODO: decouple api and game
-    api = OGS_API_Agent()
-    def fetch_board():
-        game = api.get_game(gid)
-        return Board.from_game_api(game)
-    play_game(p1, p2, fetch_board)
-
-my_agent = OGS_API_Agent()
-# gid = my_agent.get_my_current_games()[0]["id"]
-
-gid = my_agent.get_game_ids_where_its_my_turn()[0]
+def measure_import_time(modules=LIBRARY_MODULES, repeat=IMPORT_TIME_REPEAT):
+    # Imports modules in repeat fresh interpreters and returns the fewest seconds
+    # that took (not counting interpreter startup). Like bench.py, we take the best
+    # run, since anything slower is just noise from the rest of the machine.
+    code = "import time; start = time.time(); import %s; print time.time() - start"%", ".join(modules)
+    return min(
+        float(subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ))
+        for run_num in xrange(repeat)
+    )
 
-# gid = 3581924
-go = lambda: play_ogs_game(gid, Random_Strategy(gid), OGS_Reciever_Strategy(gid))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="A go bot for online-go.com")
+    parser.add_argument("--verbose", "-v", action="store_true", help="log every API request")
+    parser.add_argument("--metrics-file", help="write request metrics (Prometheus text format) here on exit")
+    subparsers = parser.add_subparsers(dest="command")
+
+    play_parser = subparsers.add_parser("play", help="play one game until it ends")
+    play_parser.add_argument("--game-id", type=int, help="defaults to the first game where it's our turn")
+    play_parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="random")
+    play_parser.add_argument("--realtime", action="store_true", help="wait for opponent moves on the realtime API instead of polling")
+    play_parser.add_argument("--book", help="answer opening moves from this opening book")
+
+    manage_parser = subparsers.add_parser("manage", help="play all of our active games")
+    manage_parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="random")
+    manage_parser.add_argument("--workers", type=int, default=8)
+    manage_parser.add_argument("--store", help="keep games in this SQLite file across runs")
+    manage_parser.add_argument("--book", help="answer opening moves from this opening book")
+
+    sync_parser = subparsers.add_parser("sync-games", help="update a local SQLite store of our games")
+    sync_parser.add_argument("--store", default="games.sqlite3")
+
+    book_parser = subparsers.add_parser("build-book", help="build an opening book from the finished games in a store, or from SGF files")
+    book_parser.add_argument("--store", default="games.sqlite3")
+    book_parser.add_argument("--sgf", nargs="+", help="SGF files or directories to use instead of the store")
+    book_parser.add_argument("--workers", type=int)
+    book_parser.add_argument("--output", default=opening_book.DEFAULT_PATH)
+    book_parser.add_argument("--max-depth", type=int, default=opening_book.MAX_DEPTH)
+
+    replay_parser = subparsers.add_parser("replay-sgf", help="replay SGF files (or directories of them) and report any errors")
+    replay_parser.add_argument("paths", nargs="+")
+    replay_parser.add_argument("--workers", type=int)
+
+    export_parser = subparsers.add_parser("export-sgf", help="write the finished games in a store out as SGF files")
+    export_parser.add_argument("--store", default="games.sqlite3")
+    export_parser.add_argument("--output", default=".", help="directory to write <game id>.sgf files to")
+
+    interesting_parser = subparsers.add_parser("interesting-games", help="list ongoing ranked 19x19 games")
+    interesting_parser.add_argument("--count", type=int, default=100)
+
+    subparsers.add_parser("import-time", help="check the library's import time against IMPORT_TIME_BUDGET")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s")
+    if args.metrics_file:
+        atexit.register(ogs_metrics.registry().dump, args.metrics_file)
+
+    # Map the book before anything else, so it's ready for the first move
+    book = opening_book.Opening_Book(args.book) if getattr(args, "book", None) else None
+
+    if args.command == "play":
+        gid = args.game_id
+        if gid is None:
+            gid = shared_agent().get_game_ids_where_its_my_turn()[0]
+        reciever_class = OGS_Realtime_Reciever_Strategy if args.realtime else OGS_Reciever_Strategy
+        play_ogs_game(gid, STRATEGIES[args.strategy](gid), reciever_class(gid), book)
+    elif args.command == "manage":
+        Game_Manager(
+            STRATEGIES[args.strategy],
+            num_workers=args.workers,
+            metrics_file=args.metrics_file,
+            store=Game_Store(args.store) if args.store else None,
+            book=book,
+        ).run()
+    elif args.command == "sync-games":
+        store = Game_Store(args.store)
+        fetched = store.sync(shared_agent())
+        print "Fetched %d games into %s"%(len(fetched), args.store)
+    elif args.command == "build-book":
+        if args.sgf:
+            num_records = opening_book.build_from_sgf(args.sgf, args.output, max_depth=args.max_depth, num_workers=args.workers)
+        else:
+            num_records = opening_book.build(Game_Store(args.store), args.output, max_depth=args.max_depth)
+        print "Wrote %d book positions to %s"%(num_records, args.output)
+    elif args.command == "replay-sgf":
+        stats = corpus.replay(args.paths, num_workers=args.workers)
+        for error in stats.errors:
+            print "%s: game %d, move %s: %s"%error
+        print stats
+        return 1 if stats.errors else 0
+    elif args.command == "export-sgf":
+        store = Game_Store(args.store)
+        game_ids = sorted(store.game_ids("finished"))
+        for game_id in game_ids:
+            with open(os.path.join(args.output, "%d.sgf"%game_id), "w") as file_:
+                file_.write(sgf.from_ogs_game(store.get_game(game_id)))
+        print "Wrote %d games to %s"%(len(game_ids), args.output)
+    elif args.command == "interesting-games":
+        print_current_interesting_games(args.count)
+    elif args.command == "import-time":
+        elapsed = measure_import_time()
+        print "Imported %s in %.1fms (best of %d; budget: %.1fms)"%(
+            ", ".join(LIBRARY_MODULES), 1000*elapsed, IMPORT_TIME_REPEAT, 1000*IMPORT_TIME_BUDGET,
+        )
+        return 0 if elapsed <= IMPORT_TIME_BUDGET else 1
+    return 0
 
-g = my_agent.get_game(gid)
-b = Board.from_game_api(g)
+if __name__ == "__main__":
+    sys.exit(main())
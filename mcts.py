@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+# Monte Carlo Tree Search (UCT) with light random playouts (or another playout
+# policy, e.g. patterns.playout).
+# Works on main.Board, but only through its index-level interface
+# (copy, player, legal_indices, play_index, pass_turn, random_legal_index, area_score),
+# so this module doesn't need to import main.
+
+import math
+import random
+from time import time
+
+PASS = -1 # move index used for a pass
+
+class Node(object):
+    __slots__ = ("move", "parent", "mover", "num_passes", "children", "untried", "visits", "wins", "key")
+
+    def __init__(self, move, parent, mover, num_passes, untried, key=None):
+        self.move = move
+        self.parent = parent
+        self.mover = mover # the color that played move (wins are counted for them)
+        self.num_passes = num_passes # consecutive passes leading here; 2 ends the game
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0
+        self.key = key # transposition table key, when searching with one
+
+    def is_terminal(self):
+        return self.num_passes >= 2
+
+    def best_child(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(
+            self.children,
+            key=(lambda child:
+                child.wins / float(child.visits) +
+                exploration * math.sqrt(log_visits / child.visits)
+            ),
+        )
+
+class Search_Result(object):
+    def __init__(self, move, root, playouts, elapsed):
+        self.move = move
+        self.root = root
+        self.playouts = playouts
+        self.elapsed = elapsed
+
+    @property
+    def playouts_per_second(self):
+        return self.playouts / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return "%d playouts in %.2fs (%.0f playouts/s)"%(
+            self.playouts, self.elapsed, self.playouts_per_second,
+        )
+
+def _untried_moves(board, num_passes):
+    if num_passes >= 2:
+        return []
+    return list(board.legal_indices()) + [PASS]
+
+def _apply(board, move):
+    if move == PASS:
+        board.pass_turn()
+    else:
+        board.play_index(move)
+
+def playout(board, rng=random, max_moves=None):
+    # Plays random (non eye-filling) moves on board until both players pass.
+    # Returns the winning color. Mutates board.
+    if max_moves is None:
+        max_moves = 3 * board.size * board.size
+    num_passes = 0
+    for move_num in xrange(max_moves):
+        idx = board.random_legal_index(rng, avoid_own_eyes=True)
+        if idx is None:
+            board.pass_turn()
+            num_passes += 1
+            if num_passes >= 2:
+                break
+        else:
+            board.play_index(idx)
+            num_passes = 0
+    return board
+
+def winner(board, komi):
+    return board.BLACK if board.area_score(komi) > 0 else board.WHITE
+
+def search(board, seconds=None, playouts=None, komi=6.5, exploration=1.4, rng=random, deadline=None, table=None, policy=playout):
+    """ Runs UCT from board's position until the budget runs out, and returns a
+        Search_Result whose move is the most visited root move (a point index or PASS).
+        The budget is a wall-clock time in seconds, a number of playouts, an absolute
+        deadline (as returned by time.time()), or any combination (whichever runs out first).
+        With a transposition.Transposition_Table, nodes start from the statistics earlier
+        searches gathered for their positions, and this search's are stored back.
+        policy plays each simulated game out (policy(board, rng), like playout).
+        board itself isn't modified.
+    """
+    if seconds is None and playouts is None and deadline is None:
+        raise ValueError("search needs a time or playout budget")
+    start = time()
+    if seconds is not None:
+        deadline = min(deadline, start + seconds) if deadline is not None else start + seconds
+
+    root = Node(None, None, board.BLACK + board.WHITE - board.player, 0, _untried_moves(board, 0))
+    if table is not None:
+        _load_stats(root, table, table.key(board, 0))
+    num_playouts = 0
+    while True:
+        if playouts is not None and num_playouts >= playouts:
+            break
+        if deadline is not None and time() >= deadline:
+            break
+        run_iteration(root, board, komi, exploration, rng, table, policy)
+        num_playouts += 1
+    if table is not None:
+        _store_stats(root, table)
+
+    elapsed = time() - start
+    if root.children:
+        move = max(root.children, key=(lambda child: child.visits)).move
+    else:
+        move = PASS
+    return Search_Result(move, root, num_playouts, elapsed)
+
+def _load_stats(node, table, key):
+    node.key = key
+    stats = table.get(key)
+    if stats is not None:
+        node.visits, node.wins = stats
+
+def _store_stats(root, table):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        table.store(node.key, node.visits, node.wins)
+        stack.extend(node.children)
+
+def run_iteration(root, board, komi, exploration, rng=random, table=None, policy=playout):
+    # One select / expand / playout / backpropagate cycle
+    node = root
+    scratch = board.copy()
+
+    # 1) Select
+    while not node.untried and node.children:
+        node = node.best_child(exploration)
+        _apply(scratch, node.move)
+
+    # 2) Expand
+    if node.untried:
+        move = node.untried.pop(int(rng.random() * len(node.untried)))
+        mover = scratch.player
+        _apply(scratch, move)
+        num_passes = node.num_passes + 1 if move == PASS else 0
+        child = Node(move, node, mover, num_passes, _untried_moves(scratch, num_passes))
+        if table is not None:
+            _load_stats(child, table, table.key(scratch, num_passes))
+        node.children.append(child)
+        node = child
+
+    # 3) Playout
+    if not node.is_terminal():
+        policy(scratch, rng)
+    won = winner(scratch, komi)
+
+    # 4) Backpropagate
+    while node is not None:
+        node.visits += 1
+        if node.mover == won:
+            node.wins += 1
+        node = node.parent
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+
+# A small local stand-in for the parts of the online-go.com REST API that the bot
+# uses, for benchmarks and manual testing. Point an agent at it with
+#   OGS_API_Agent.API_ROOT = server.api_root
+#   ogs_auth.configure_shared_credentials(oauth_url=server.oauth_url)
+# (or a subclass with its own API_ROOT).
+#
+# It also stands in for the realtime (socket.io) API at server.realtime_url, as
+# far as ogs_realtime.Realtime_Game_Channel needs it: Engine.IO's long-polling
+# transport (protocol 3, no websocket upgrade), "game/connect" subscriptions, and
+# a "game/<id>/move" event for every move submitted through the REST API (or
+# pushed with state.push_move). state.drop_realtime_connections() simulates the
+# socket going down.
+
+import json
+import uuid
+import hashlib
+import threading
+import BaseHTTPServer
+import SocketServer
+from urllib import urlencode
+from urlparse import urlparse, parse_qs
+
+REALTIME_POLL_TIMEOUT = 5 # seconds a long poll waits for something to send
+
+class Mock_OGS_State(object):
+    def __init__(self, num_listed_games=0, page_size=10, player_id=1):
+        self.lock = threading.Lock()
+        self.page_size = page_size
+        self.player_id = player_id
+        self.games = {} # game id -> game JSON, as returned by games/<id>
+        self.listed_games = [
+            {
+                "id": game_id,
+                "width": 19,
+                "height": 19,
+                "players": {"black": {"id": player_id}, "white": {"id": player_id + 1 + game_id % 5}},
+                "started": game_id,
+                "ended": None,
+                "time_per_move": game_id % 97,
+            }
+            for game_id in xrange(num_listed_games)
+        ]
+        self.notifications = []
+        self.num_requests = 0
+        self.num_tokens_issued = 0
+        self.realtime_sessions = {} # Engine.IO session id -> Mock_Realtime_Session
+        self.realtime_changed = threading.Condition(self.lock)
+
+    def add_game(self, game):
+        with self.lock:
+            self.games[game["id"]] = game
+
+    def push_move(self, game_id, x, y):
+        # Plays a move (e.g. the opponent's) as if through the REST API
+        with self.lock:
+            self._add_move(game_id, x, y)
+
+    def _add_move(self, game_id, x, y):
+        # Must hold self.lock
+        moves = self.games[game_id]["gamedata"]["moves"]
+        moves.append([x, y, 0])
+        self._broadcast(game_id, "game/%d/move"%game_id, {
+            "game_id": game_id,
+            "move_number": len(moves),
+            "move": [x, y, 0],
+        })
+
+    def _broadcast(self, game_id, event, data):
+        packet = "2" + json.dumps([event, data]) # a socket.io event
+        for session in self.realtime_sessions.itervalues():
+            if game_id in session.game_ids:
+                session.outbox.append((4, packet)) # in an Engine.IO message
+        self.realtime_changed.notify_all()
+
+    def drop_realtime_connections(self):
+        # Forgets every realtime session, so clients see their connection fail
+        with self.lock:
+            self.realtime_sessions.clear()
+            self.realtime_changed.notify_all()
+
+class Mock_Realtime_Session(object):
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.game_ids = set() # games subscribed to with "game/connect"
+        self.outbox = [] # (Engine.IO packet type, data) waiting for the next poll
+
+def encode_engineio_payload(packets):
+    # Engine.IO 3 binary payload: for each packet, 0, the length's decimal digits
+    # as bytes, 255, then the packet (its type digit and data)
+    res = bytearray()
+    for packet_type, data in packets:
+        text = str(packet_type) + data
+        res.append(0)
+        res.extend(int(digit) for digit in str(len(text)))
+        res.append(255)
+        res.extend(text)
+    return str(res)
+
+def decode_engineio_payload(body):
+    body = bytearray(body)
+    packets = []
+    pos = 0
+    while pos < len(body):
+        pos += 1 # the 0 (string packet) marker
+        length = 0
+        while body[pos] != 255:
+            length = 10*length + body[pos]
+            pos += 1
+        text = str(body[pos + 1:pos + 1 + length])
+        packets.append((int(text[0]), text[1:]))
+        pos += 1 + length
+    return packets
+
+class Mock_OGS_Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real thing
+    wbufsize = -1 # send each response in one go, rather than tripping over delayed ACKs
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, obj, status=200, etag=False):
+        body = json.dumps(obj)
+        if etag:
+            tag = '"%s"'%hashlib.md5(body).hexdigest()
+            if self.headers.getheader("If-None-Match") == tag:
+                self.send_response(304)
+                self.send_header("ETag", tag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", tag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_body(self, body, status=200, content_type="application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _is_realtime(self):
+        return urlparse(self.path).path.startswith("/socket.io/")
+
+    def _realtime_get(self):
+        # Opens a session, or long-polls an open one for its queued packets
+        state = self.server.state
+        sid = parse_qs(urlparse(self.path).query).get("sid", [None])[0]
+        with state.lock:
+            if sid is None:
+                session = Mock_Realtime_Session()
+                state.realtime_sessions[session.id] = session
+                handshake = {"sid": session.id, "upgrades": [], "pingInterval": 25000, "pingTimeout": 60000}
+                packets = [(0, json.dumps(handshake))]
+            else:
+                session = state.realtime_sessions.get(sid)
+                if session is not None and not session.outbox:
+                    state.realtime_changed.wait(REALTIME_POLL_TIMEOUT)
+                    session = state.realtime_sessions.get(sid)
+                if session is None:
+                    packets = None
+                else:
+                    packets, session.outbox = session.outbox or [(6, "")], [] # 6: noop
+        if packets is None:
+            self._send_body("Session ID unknown", status=400, content_type="text/plain")
+        else:
+            self._send_body(encode_engineio_payload(packets))
+
+    def _realtime_post(self, body):
+        # Packets from the client: pings, socket.io events and closes
+        state = self.server.state
+        sid = parse_qs(urlparse(self.path).query).get("sid", [None])[0]
+        with state.lock:
+            session = state.realtime_sessions.get(sid)
+            if session is not None:
+                for packet_type, data in decode_engineio_payload(body):
+                    if packet_type == 2: # ping
+                        session.outbox.append((3, data))
+                    elif packet_type == 1: # close
+                        del state.realtime_sessions[sid]
+                        break
+                    elif packet_type == 4 and data.startswith("2"): # socket.io event
+                        event = json.loads(data[1:])
+                        if event[0] == "game/connect":
+                            session.game_ids.add(event[1]["game_id"])
+                state.realtime_changed.notify_all()
+        if session is None:
+            self._send_body("Session ID unknown", status=400, content_type="text/plain")
+        else:
+            self._send_body("ok", content_type="text/plain")
+
+    def _parts(self):
+        parsed = urlparse(self.path)
+        parts = [part for part in parsed.path.split("/") if part]
+        assert parts[:2] == ["api", "v1"], parsed.path
+        return parts[2:], parse_qs(parsed.query)
+
+    def do_GET(self):
+        if self._is_realtime():
+            return self._realtime_get()
+        state = self.server.state
+        parts, query = self._parts()
+        with state.lock:
+            state.num_requests += 1
+            if parts in (["games"], ["me", "games"]):
+                records = state.listed_games
+                if query.get("ordering") == ["-id"]:
+                    records = records[::-1]
+                self._send_json(self._page(records, query))
+            elif len(parts) == 2 and parts[0] == "games" and int(parts[1]) in state.games:
+                self._send_json(state.games[int(parts[1])], etag=True)
+            elif parts == ["me", "notifications"]:
+                self._send_json(state.notifications)
+            elif parts == ["me"]:
+                self._send_json({"id": state.player_id})
+            else:
+                self._send_json({"detail": "Not found."}, status=404)
+
+    def do_POST(self):
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.getheader("Content-Length") or 0))
+        if self._is_realtime():
+            return self._realtime_post(body)
+        if urlparse(self.path).path.rstrip("/") == "/oauth2/access_token":
+            with state.lock:
+                state.num_tokens_issued += 1
+                self._send_json({
+                    "access_token": "mock-token-%d"%state.num_tokens_issued,
+                    "refresh_token": "mock-refresh-%d"%state.num_tokens_issued,
+                    "expires_in": 36000,
+                })
+            return
+        parts, query = self._parts()
+        with state.lock:
+            state.num_requests += 1
+            if len(parts) == 3 and parts[0] == "games" and int(parts[1]) in state.games:
+                if parts[2] == "move":
+                    cx, cy = json.loads(body)["move"]
+                    state._add_move(int(parts[1]), "abcdefghijklmnopqrs".index(cx), "abcdefghijklmnopqrs".index(cy))
+                elif parts[2] == "pass":
+                    state._add_move(int(parts[1]), -1, -1)
+                self._send_json({})
+            else:
+                self._send_json({"detail": "Not found."}, status=404)
+
+    def _page(self, records, query):
+        page = int(query.get("page", ["1"])[0])
+        page_size = int(query.get("page_size", [str(self.server.state.page_size)])[0])
+        start = (page - 1)*page_size
+        if start + page_size < len(records):
+            # Same query (ordering etc.), but the next page
+            next_query = dict(query, page=[str(page + 1)])
+            next_url = "%s/%s?%s"%(
+                self.server.api_root, urlparse(self.path).path.strip("/")[len("api/v1/"):],
+                urlencode(sorted(next_query.items()), doseq=True),
+            )
+        else:
+            next_url = None
+        return {
+            "count": len(records),
+            "next": next_url,
+            "previous": None,
+            "results": records[start:start + page_size],
+        }
+
+class Mock_OGS_Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state=None, port=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", port), Mock_OGS_Handler)
+        self.state = state or Mock_OGS_State()
+        self.thread = None
+
+    @property
+    def api_root(self):
+        return "http://127.0.0.1:%d/api/v1"%self.server_port
+
+    @property
+    def realtime_url(self):
+        return "http://127.0.0.1:%d"%self.server_port
+
+    @property
+    def oauth_url(self):
+        return "http://127.0.0.1:%d/oauth2/access_token"%self.server_port
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
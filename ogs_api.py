@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+import copy
+import json
+import heapq
+import logging
+import operator as ops
+from time import time
+from urllib import urlencode
+
+import utils
+import ogs_auth
+import ogs_session
+import ogs_metrics
+import rate_limit
+import response_cache
+
+logger = logging.getLogger("ogs_api")
+
+class OGS_API_Agent(object):
+    # Point this at a local stand-in server to test without touching online-go.com
+    # (and ogs_auth.Credentials' oauth_url, if you need a token from it too)
+    API_ROOT = "https://online-go.com/api/v1"
+
+    def __init__(self, session=None, cache=None, credentials=None):
+        # Unless told otherwise, all agents share one pooled keep-alive session, one
+        # response cache and one set of credentials. Usually you just want shared_agent().
+        self.session = session or ogs_session.shared_session()
+        self.cache = response_cache.shared_cache() if cache is None else cache
+        self.credentials = credentials or ogs_auth.shared_credentials()
+
+    @classmethod
+    def stub(klass, api_endpoint):
+        return "%s/%s/"%(klass.API_ROOT, api_endpoint.strip("/"))
+
+    @property
+    def access_token(self):
+        # Loaded once per process and refreshed ahead of expiry; see ogs_auth
+        return self.credentials.access_token()
+
+    def log(self, msg, level=logging.INFO):
+        logger.log(level, msg)
+
+    def basic_headers(self):
+        return {
+            "Authorization": "Bearer %s"%self.access_token,
+        }
+
+    def get(self, url, params={}, headers={}, priority=rate_limit.POLL, use_cache=True):
+        # 1) Prepare parameters
+        if params:
+            url = "{}?{}".format(url, urlencode(params))
+        headers = utils.dict_merge(
+            self.basic_headers(),
+            headers,
+        )
+
+        # 2) Check the cache
+        cache_key = (url, self.access_token)
+        entry = self.cache.lookup(cache_key) if use_cache else None
+        if entry is not None:
+            if time() < entry.expires:
+                self._count_cache_result(url, "hit")
+                return utils.Either(True, json.loads(entry.body))
+            headers = utils.dict_merge(headers, entry.validation_headers())
+
+        # Headers aren't logged: they carry the access token
+        logger.debug("GET %s", url)
+
+        # 3) Send request
+        response = self._send("GET", url, headers=headers, priority=priority)
+
+        # 4) Read response
+        if entry is not None and response.status_code == 304:
+            self.cache.refresh(url, entry, response)
+            self._count_cache_result(url, "revalidated")
+            return utils.Either(True, json.loads(entry.body))
+        if use_cache:
+            self._count_cache_result(url, "miss")
+            if response.status_code == 200:
+                self.cache.store(cache_key, url, response)
+        return utils.Either.from_response(response)
+
+    @staticmethod
+    def _count_cache_result(url, result):
+        ogs_metrics.registry().increment(
+            "ogs_cache_requests_total",
+            endpoint=ogs_metrics.endpoint_name(url),
+            result=result,
+        )
+
+    def post(self, url, data, params={}, headers={}, priority=rate_limit.POLL):
+        # 1) Prepare parameters
+        if params:
+            url = "{}?{}".format(url, urlencode(params))
+        headers = utils.dict_merge(
+            self.basic_headers(),
+            headers,
+        )
+
+        logger.debug("POST %s data=%r", url, data)
+
+        # 2) Send request
+        response = self._send("POST", url, data=data, headers=headers, priority=priority)
+
+        # 3) Read response
+        return utils.Either.from_response(response)
+
+    MAX_RATE_LIMIT_RETRIES = 3
+
+    def _send(self, method, url, data=None, headers={}, priority=rate_limit.POLL):
+        # Sends the request once the shared rate limiter lets us, retrying (after the
+        # server's Retry-After) if we get rate limited anyway, and once with a new
+        # token if the server rejects ours. Records each attempt's latency, status
+        # and size in ogs_metrics
+        metrics = ogs_metrics.registry()
+        scheduler = rate_limit.shared_scheduler()
+        num_rate_limited = 0
+        reauthorized = False
+        while True:
+            scheduler.acquire(priority)
+            start = time()
+            try:
+                response = self.session.request(method, url, data=data, headers=headers)
+            except Exception:
+                metrics.observe_request(method, url, "error", time() - start, len(data or ""))
+                raise
+            metrics.observe_request(
+                method, url, response.status_code, time() - start,
+                len(data or ""), len(response.content),
+            )
+            if response.status_code == 401 and not reauthorized and "Authorization" in headers:
+                # Revoked, or expired before we expected: get a new token and try again
+                reauthorized = True
+                self.log("Access token rejected on %s; getting a new one"%url, logging.WARNING)
+                self.credentials.invalidate(headers["Authorization"].split(" ", 1)[-1])
+                headers = utils.dict_merge(headers, self.basic_headers())
+                continue
+            if response.status_code != 429 or num_rate_limited == self.MAX_RATE_LIMIT_RETRIES:
+                return response
+            num_rate_limited += 1
+            retry_after = rate_limit.parse_retry_after(response.headers.get("Retry-After"))
+            self.log("Rate limited on %s; backing off for %.1fs"%(url, retry_after), logging.WARNING)
+            scheduler.penalize(retry_after)
+
+    # Convinience / testing functions
+    def sget(self, url_stub, all=False, *args, **kwargs):
+        if all:
+            return self.get_all(self.stub(url_stub), *args, **kwargs).contents()
+        else:
+            return self.get(self.stub(url_stub), *args, **kwargs).fmap_left(
+                (lambda resp: "Request failed: %s"%resp.text)
+            ).contents()
+
+    def siter(self, url_stub, *args, **kwargs):
+        return self.iter_all(self.stub(url_stub), *args, **kwargs)
+
+    def spost(self, url_stub, *args, **kwargs):
+        return self.post(self.stub(url_stub), *args, **kwargs).fmap_left(
+            (lambda resp: "Request failed: %s"%resp.text)
+        ).contents()
+
+    def get_all(self, url, params={}, headers={}, LIMIT=1000, parallel=False, max_in_flight=4):
+        data = self.get(url, params=params, headers=headers, priority=rate_limit.LISTING)
+        if not data:
+            return data
+        elif data["count"] > LIMIT:
+            return utils.Either(False, "You are not allowed to retrieve more than %d records at once"%LIMIT)
+        elif parallel:
+            return self._get_remaining_pages(url, params, headers, data.contents(), max_in_flight)
+        else:
+            aggregate = copy.copy(data["results"])
+            while data["next"]:
+                next_url = data["next"]
+                data = self.get(next_url, headers=headers, priority=rate_limit.LISTING) # TODO: include headers here?
+                aggregate.extend(data["results"])
+            return utils.Either(True, aggregate)
+
+    def iter_all(self, url, params={}, headers={}, limit=None):
+        # Lazily yields records page by page as they arrive, so there is no cap on the
+        # total count and nothing beyond the current page is held in memory.
+        # Stop early by passing limit or by simply not consuming the rest.
+        if limit is not None and limit <= 0:
+            return
+        num_yielded = 0
+        data = self.get(url, params=params, headers=headers, priority=rate_limit.LISTING)
+        while True:
+            for record in data.fmap_left(
+                        (lambda resp: "Request failed: %s"%resp.text)
+                    ).contents()["results"]:
+                yield record
+                num_yielded += 1
+                if limit is not None and num_yielded >= limit:
+                    return
+            if not data["next"]:
+                return
+            data = self.get(data["next"], headers=headers, priority=rate_limit.LISTING)
+
+    def _get_remaining_pages(self, url, params, headers, first_page, max_in_flight):
+        # The first page tells us the total count and (since more pages follow it) the
+        # page size, so we can work out every remaining page number up front and fetch
+        # them concurrently. ThreadPool.map keeps the results in page order.
+        aggregate = copy.copy(first_page["results"])
+        if not first_page["next"]:
+            return utils.Either(True, aggregate)
+
+        page_size = len(first_page["results"])
+        num_pages = (first_page["count"] + page_size - 1) // page_size
+        page_params = [
+            utils.dict_merge(params, {"page": page_num})
+            for page_num in xrange(2, num_pages + 1)
+        ]
+
+        from multiprocessing.pool import ThreadPool # imported here to keep "import ogs_api" cheap
+        pool = ThreadPool(min(max_in_flight, len(page_params)))
+        try:
+            pages = pool.map(
+                (lambda page_param: self.get(url, params=page_param, headers=headers, priority=rate_limit.LISTING)),
+                page_params,
+            )
+        finally:
+            pool.close()
+
+        for page in pages:
+            if not page:
+                return page
+            aggregate.extend(page["results"])
+        return utils.Either(True, aggregate)
+
+    @classmethod
+    def sort_key(klass, fields):
+        return lambda game: map(lambda field: ops.itemgetter(field)(game), fields)
+
+    @classmethod
+    def sort_map(klass, game_list, fields):
+        key = klass.sort_key(fields)
+        return map(key, sorted(games, key=key))
+
+    @classmethod
+    def top_k(klass, records, k, fields, reverse=False):
+        # Keeps only k records in memory at a time, so this works on iter_all streams
+        # of any length. Returns them sorted (largest first if reverse).
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return select(k, records, key=klass.sort_key(fields))
+
+    def get_game(self, game_id):
+        return self.sget("games/%d"%game_id)
+
+    def get_game_ids_where_its_my_turn(self):
+        # TODO: delete? / reorganize somewhere
+
+        # notifications = self.sget(
+        #     "me/notifications",
+        #     params={"type": "yourMove"},
+        # ) # TODO: report this bug; me/notifiations ignores params entirely it seems
+        notifications = self.sget("me/notifications")
+
+        return [
+            notif["game_id"]
+            for notif in notifications
+            if notif["type"] == "yourMove"
+        ]
+
+    def get_my_current_games(self):
+        # TODO: delete? / reorganize somewhere
+        games = self.sget(
+            "me/games",
+            all=True,
+            parallel=True,
+            params={
+                "started__isnull": False,
+                "ended__isnull": True,
+            },
+        )
+        return sorted(games, key=self.sort_key(("started",)))
+
+_shared_agent = utils.Shared_Instance(OGS_API_Agent)
+
+def shared_agent():
+    """ Returns the process-wide OGS_API_Agent, creating it on first use """
+    return _shared_agent.get()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+# OAuth credentials for online-go.com, shared by every OGS_API_Agent in the
+# process. The token is read from disk (or generated) once, and refreshed a while
+# before it expires, under a lock so concurrent agents never race to generate one.
+#
+# access_token.txt holds JSON: {"access_token": ..., "refresh_token": ..., "issued_at": ..., "expires_at": ...}
+# A file holding just a bare token (the old format) is still accepted; since we
+# don't know when it was issued, we assume it expires a year after the file was written.
+
+import os
+import json
+import logging
+import threading
+from time import time
+from urllib import urlencode
+
+import utils
+import ogs_session
+
+logger = logging.getLogger("ogs_auth")
+
+OAUTH_URL = "https://online-go.com/oauth2/access_token"
+TOKEN_FILE = "access_token.txt"
+USER_FILE = "gobot_user.cfg"
+CLIENT_FILE = "client.cfg"
+
+DAYS = 24*60*60
+DEFAULT_LIFETIME = 365*DAYS # for tokens whose expiry we weren't told
+# Refresh once this fraction of the token's lifetime is left, but never more than
+# REFRESH_MARGIN early (so a year-long token isn't refreshed months ahead)
+REFRESH_FRACTION = 0.1
+REFRESH_MARGIN = 7*DAYS
+RETRY_PERIOD = 60 # after a failed refresh, keep using the old token for this long before trying again
+
+class Credentials(object):
+    def __init__(self, token_file=TOKEN_FILE, user_file=USER_FILE, client_file=CLIENT_FILE, oauth_url=OAUTH_URL):
+        self.token_file = token_file
+        self.user_file = user_file
+        self.client_file = client_file
+        self.oauth_url = oauth_url
+        self.lock = threading.Lock()
+        self.token = None
+        self.refresh_token = None
+        self.expires_at = 0
+        self.next_refresh = 0
+
+    def access_token(self):
+        with self.lock:
+            if self.token is None:
+                self._load()
+            now = time()
+            if now >= self.next_refresh:
+                self._refresh(now)
+            return self.token
+
+    def invalidate(self, token=None):
+        # Forces a refresh on the next access_token(), after the server rejected
+        # token. If another thread has already replaced that token, there's nothing to do.
+        with self.lock:
+            if token is None or token == self.token:
+                self.expires_at = self.next_refresh = 0
+
+    def _load(self):
+        if not os.path.exists(self.token_file):
+            self._save(self._request_token(self._password_grant()))
+            return
+        contents = utils.file_to_string(self.token_file).strip()
+        try:
+            saved = json.loads(contents)
+        except ValueError:
+            issued_at = os.path.getmtime(self.token_file)
+            saved = {"access_token": contents, "issued_at": issued_at, "expires_at": issued_at + DEFAULT_LIFETIME}
+        self._set(saved)
+
+    def _refresh(self, now):
+        make_grants = [self._password_grant]
+        if self.refresh_token:
+            make_grants.insert(0, (lambda: {"grant_type": "refresh_token", "refresh_token": self.refresh_token}))
+        error = None
+        for make_grant in make_grants:
+            try:
+                self._save(self._request_token(make_grant()))
+                return
+            except Exception as e:
+                error = e
+        if now < self.expires_at:
+            # Not urgent yet; carry on with the token we have
+            logger.warning("Couldn't refresh the access token (%r); retrying in %ds", error, RETRY_PERIOD)
+            self.next_refresh = now + RETRY_PERIOD
+        else:
+            raise error
+
+    def _password_grant(self):
+        # Important: the files we read here should NOT be checked into source-control (e.g. git).
+        # You'll have to create them yourself and add them to your .gitignore file
+        # That's why we're reading them from local files, rather than having them be hard-coded strings
+        user_config = self._config(self.user_file)
+        return {
+            "grant_type": "password",
+            "username": user_config["username"], # contains your username
+            "password": user_config["app_specific_password"], # generated on your user settings page
+        } # TODO: document this better, probably with an example file or two
+
+    def _config(self, path):
+        if not os.path.exists(path):
+            raise Exception, "You are missing some config files (specifically, ./%s)"%path
+        return utils.config_as_dict(path)["values"]
+
+    def _request_token(self, grant):
+        logger.info("Requesting a new access token (%s grant)...", grant["grant_type"])
+        client_config = self._config(self.client_file)
+        values = urlencode(utils.dict_merge(grant, {
+            "client_id": client_config["id"], # generated on https://online-go.com/developer
+            "client_secret": client_config["secret"], # generated on https://online-go.com/developer
+        }))
+        headers = {
+          'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        response = ogs_session.shared_session().post(self.oauth_url, data=values, headers=headers)
+        value = utils.Either.from_response(response).fmap_left(
+            (lambda resp: "Token request failed: %s"%resp.text)
+        ).contents()
+        issued_at = time()
+        return {
+            "access_token": value["access_token"],
+            "refresh_token": value.get("refresh_token"),
+            "issued_at": issued_at,
+            "expires_at": issued_at + value.get("expires_in", DEFAULT_LIFETIME),
+        }
+
+    def _set(self, saved):
+        self.token = saved["access_token"]
+        self.refresh_token = saved.get("refresh_token")
+        self.expires_at = saved["expires_at"]
+        lifetime = self.expires_at - saved.get("issued_at", self.expires_at - DEFAULT_LIFETIME)
+        self.next_refresh = self.expires_at - min(REFRESH_MARGIN, REFRESH_FRACTION*lifetime)
+
+    def _save(self, saved):
+        self._set(saved)
+        # Write then rename, so another process never reads a half-written token
+        tmp_path = "%s.tmp"%self.token_file
+        with open(tmp_path, "w") as file_:
+            json.dump(saved, file_)
+        os.rename(tmp_path, self.token_file)
+
+_shared_credentials = utils.Shared_Instance(Credentials)
+
+def shared_credentials():
+    return _shared_credentials.get()
+
+def configure_shared_credentials(**kwargs):
+    """ Replaces the process-wide credentials, e.g. to use a different token file """
+    return _shared_credentials.replace(**kwargs)
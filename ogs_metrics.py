@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+# Process-wide request metrics for the OGS client: per-endpoint request counts
+# by status code, latency histograms and bytes transferred, plus free-form
+# counters (e.g. poll attempts). Everything can be dumped in the Prometheus text
+# exposition format, to stdout or to a local file that a collector can scrape.
+
+import os
+import re
+import threading
+from urlparse import urlparse
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+_NUMERIC_SEGMENT = re.compile(r"^\d+$")
+
+def endpoint_name(url):
+    # Collapses a request URL into a low-cardinality endpoint name, e.g.
+    #   https://online-go.com/api/v1/games/123/move/?x=1  ->  games/:id/move
+    path = urlparse(url).path.strip("/")
+    if path.startswith("api/v1/"):
+        path = path[len("api/v1/"):]
+    return "/".join(
+        ":id" if _NUMERIC_SEGMENT.match(segment) else segment
+        for segment in path.split("/")
+    )
+
+class Endpoint_Stats(object):
+    __slots__ = ("statuses", "bucket_counts", "latency_sum", "count", "bytes_sent", "bytes_received")
+
+    def __init__(self):
+        self.statuses = {} # status code (or "error") -> count
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def observe(self, status, latency, bytes_sent, bytes_received):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        for bucket_num, upper_bound in enumerate(LATENCY_BUCKETS):
+            if latency <= upper_bound:
+                self.bucket_counts[bucket_num] += 1
+                break
+        self.latency_sum += latency
+        self.count += 1
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+
+class Metrics(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {} # (method, endpoint name) -> Endpoint_Stats
+        self.counters = {} # (name, sorted label items) -> count
+
+    def observe_request(self, method, url, status, latency, bytes_sent=0, bytes_received=0):
+        key = (method, endpoint_name(url))
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = Endpoint_Stats()
+            stats.observe(status, latency, bytes_sent, bytes_received)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.iteritems())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.counters = {}
+
+    def to_text(self):
+        # Prometheus text exposition format
+        with self.lock:
+            lines = []
+            lines.append("# TYPE ogs_requests_total counter")
+            for (method, endpoint), stats in sorted(self.endpoints.iteritems()):
+                for status, count in sorted(stats.statuses.iteritems()):
+                    lines.append('ogs_requests_total{method="%s",endpoint="%s",status="%s"} %d'%(method, endpoint, status, count))
+            lines.append("# TYPE ogs_request_latency_seconds histogram")
+            for (method, endpoint), stats in sorted(self.endpoints.iteritems()):
+                labels = 'method="%s",endpoint="%s"'%(method, endpoint)
+                cumulative = 0
+                for upper_bound, count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                    cumulative += count
+                    le = "+Inf" if upper_bound == float("inf") else repr(upper_bound)
+                    lines.append('ogs_request_latency_seconds_bucket{%s,le="%s"} %d'%(labels, le, cumulative))
+                lines.append("ogs_request_latency_seconds_sum{%s} %f"%(labels, stats.latency_sum))
+                lines.append("ogs_request_latency_seconds_count{%s} %d"%(labels, stats.count))
+            lines.append("# TYPE ogs_request_bytes_sent_total counter")
+            for (method, endpoint), stats in sorted(self.endpoints.iteritems()):
+                lines.append('ogs_request_bytes_sent_total{method="%s",endpoint="%s"} %d'%(method, endpoint, stats.bytes_sent))
+            lines.append("# TYPE ogs_response_bytes_received_total counter")
+            for (method, endpoint), stats in sorted(self.endpoints.iteritems()):
+                lines.append('ogs_response_bytes_received_total{method="%s",endpoint="%s"} %d'%(method, endpoint, stats.bytes_received))
+            for (name, labels), count in sorted(self.counters.iteritems()):
+                label_str = ",".join('%s="%s"'%(key, value) for key, value in labels)
+                lines.append("%s{%s} %s"%(name, label_str, count) if label_str else "%s %s"%(name, count))
+            return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        # Writes to a temporary file and renames it, so readers never see a partial dump
+        tmp_path = "%s.tmp"%path
+        with open(tmp_path, "w") as file_:
+            file_.write(self.to_text())
+        os.rename(tmp_path, path)
+
+_registry = Metrics()
+
+def registry():
+    return _registry
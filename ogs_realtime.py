@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+import threading
+import Queue
+from urlparse import urlparse
+
+REALTIME_URL = "https://online-go.com"
+CLOSE_TIMEOUT = 5 # seconds close() waits for the socket's thread to finish
+
+class Realtime_Game_Channel(object):
+    # Subscribes to a game's OGS realtime (socket.io) channel and queues up every
+    # "game/<id>/move" event as it arrives. The socket is serviced on a daemon
+    # thread; `connected` goes False as soon as it drops, so callers can fall back
+    # to polling and call connect() again later. Each connect() replaces the
+    # previous socket, and only the current socket's thread and callbacks touch our
+    # state. A socket is only ever disconnected by its own thread, once it's
+    # replaced, closed or dropped: socketIO_client reconnects a socket that's
+    # disconnected in the middle of a wait().
+    #
+    # Requires the socketIO_client package (see requirements.txt). Without it,
+    # connect() just returns False. mock_ogs serves a local stand-in for the channel.
+
+    def __init__(self, game_id, url=REALTIME_URL, player_id=None):
+        self.game_id = game_id
+        self.url = url
+        self.player_id = player_id
+        self.events = Queue.Queue()
+        self.connected = False
+        self.socket = None
+        self.listener = None # the current socket's thread
+        self._closed = False
+
+    def connect(self):
+        try:
+            from socketIO_client import SocketIO
+        except ImportError:
+            return False
+
+        self._disconnect_socket()
+        parsed = urlparse(self.url)
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        socket = None
+        try:
+            socket = SocketIO("%s://%s"%(parsed.scheme, parsed.hostname), port, wait_for_connection=False)
+            socket.on("game/%d/move"%self.game_id, self._on_move)
+            socket.on("disconnect", (lambda *args: self._on_disconnect(socket)))
+            socket.emit("game/connect", {
+                "game_id": self.game_id,
+                "player_id": self.player_id,
+                "chat": False,
+            })
+        except Exception:
+            if socket is not None:
+                self._close_socket(socket)
+            return False
+        self.socket = socket
+        self.connected = True
+
+        self.listener = threading.Thread(target=self._listen, args=(socket,))
+        self.listener.daemon = True
+        self.listener.start()
+        return True
+
+    def _listen(self, socket):
+        try:
+            while socket is self.socket and self.connected and not self._closed:
+                socket.wait(seconds=1)
+        except Exception:
+            pass
+        finally:
+            self._on_disconnect(socket)
+            self._close_socket(socket)
+
+    def _on_move(self, event):
+        # event looks like {"game_id": ..., "move_number": ..., "move": [x, y, time]}
+        self.events.put(event)
+
+    def _on_disconnect(self, socket):
+        if socket is self.socket:
+            self.connected = False
+
+    def _disconnect_socket(self):
+        # Detaches the current socket; its thread notices within a second and closes it
+        self.socket = None
+        self.connected = False
+
+    def _close_socket(self, socket):
+        try:
+            socket.disconnect()
+        except Exception:
+            pass
+
+    def drain(self):
+        # Drops every queued event, e.g. once a poll has told us where the game is
+        while True:
+            try:
+                self.events.get_nowait()
+            except Queue.Empty:
+                return
+
+    def wait_for_move(self, timeout):
+        # Returns the next move event, or None if nothing arrived within timeout seconds
+        try:
+            return self.events.get(timeout=timeout)
+        except Queue.Empty:
+            return None
+
+    def close(self):
+        self._closed = True
+        self._disconnect_socket()
+        listener = self.listener
+        if listener is not None and listener is not threading.current_thread():
+            listener.join(CLOSE_TIMEOUT)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import random
+from time import sleep
+
+import utils
+
+class Retry_Policy(object):
+    # Bounded retries with "full jitter" exponential backoff:
+    #   delay(n) = uniform(0, min(cap, base * 2**n))
+    # Failures to connect are retried for every method, since nothing reached the
+    # server. Anything that goes wrong once the request may have been sent (a 5xx,
+    # a dropped or timed out connection) is only retried for methods in
+    # retry_methods, so we never resubmit a POST the server may have already acted on.
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, max_retries=3, backoff_base=0.25, backoff_cap=8.0,
+            retry_statuses=RETRY_STATUSES, retry_methods=("GET", "HEAD")):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_methods = frozenset(retry_methods)
+
+    def delay(self, attempt_num):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt_num))
+
+    def should_retry_response(self, method, response):
+        return method.upper() in self.retry_methods and response.status_code in self.retry_statuses
+
+    def should_retry_error(self, method, error, connect_failed):
+        # connect_failed: the request never got as far as being sent
+        return connect_failed or method.upper() in self.retry_methods
+
+class Pooled_Session(object):
+    # A keep-alive requests.Session with a bounded connection pool, so repeated
+    # calls to online-go.com reuse TCP+TLS connections instead of paying a fresh
+    # handshake every time. Safe to share between threads.
+    # Every request gets a (connect, read) timeout unless it passes its own, so a
+    # hung connection turns into an error (and maybe a retry) instead of blocking.
+    DEFAULT_TIMEOUT = (5.0, 30.0)
+
+    def __init__(self, pool_size=10, retry_policy=None, timeout=DEFAULT_TIMEOUT):
+        # requests is imported here rather than at the top, since it's slow to import
+        # and most processes that import us (e.g. search workers) never make a request
+        import requests
+        from requests.adapters import HTTPAdapter
+        from requests.packages.urllib3.exceptions import NewConnectionError
+        self.new_connection_error = NewConnectionError
+        self.request_errors = (requests.ConnectionError, requests.Timeout)
+        self.connect_timeout = requests.ConnectTimeout
+        self.pool_size = pool_size
+        self.retry_policy = retry_policy or Retry_Policy()
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            pool_block=True, # never open more than pool_size sockets per host
+            max_retries=0, # retries are handled by our own policy below
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _connect_failed(self, error):
+        # True if error happened while connecting, before anything was sent: a
+        # connect timeout, or (with urllib3's retries off) a MaxRetryError caused by
+        # a NewConnectionError. A connection dropped mid-request ("Connection
+        # aborted") is a ProtocolError instead.
+        if isinstance(error, self.connect_timeout):
+            return True
+        cause = error.args[0] if error.args else None
+        return isinstance(getattr(cause, "reason", None), self.new_connection_error)
+
+    def request(self, method, url, **kwargs):
+        policy = self.retry_policy
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt_num in xrange(policy.max_retries + 1):
+            is_last_attempt = attempt_num == policy.max_retries
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except self.request_errors as e:
+                if is_last_attempt or not policy.should_retry_error(method, e, self._connect_failed(e)):
+                    raise
+            else:
+                if is_last_attempt or not policy.should_retry_response(method, response):
+                    return response
+                response.close()
+            sleep(policy.delay(attempt_num))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+_shared_session = utils.Shared_Instance(Pooled_Session)
+
+def shared_session(**kwargs):
+    """ Returns the process-wide Pooled_Session, creating it on first use.
+        kwargs are only honoured by the call that creates the session; use
+        configure_shared_session to replace it.
+    """
+    return _shared_session.get(**kwargs)
+
+def configure_shared_session(**kwargs):
+    """ Replaces the process-wide Pooled_Session (e.g. to change the pool size) """
+    return _shared_session.replace(**kwargs)
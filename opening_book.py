@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+# An opening book built from the finished games in a game_store.Game_Store, or
+# from SGF collections (via corpus): for each position seen in the first few
+# moves of those games, how often each move was played there and how often the
+# player who played it went on to win.
+#
+# The book is a flat file of fixed-size records sorted by position hash, so it's
+# memory-mapped rather than read in, and a lookup is a binary search over the
+# mapping. Opening even a big book costs next to nothing at startup.
+#
+#   header: MAGIC, number of records (uint64)
+#   record: position hash (uint64), board size (uint8), move index (uint16), times played (uint32), wins (uint32)
+#
+# The size is part of the key because Zobrist hashes only tell positions of the
+# same size apart (every empty board hashes to 0, for one).
+
+import os
+import mmap
+import struct
+import functools
+from collections import defaultdict
+
+from board import Board
+
+MAGIC = "GOBOOK01"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QBHII")
+
+DEFAULT_PATH = "opening_book.bin"
+MAX_DEPTH = 30 # only the first this many moves of each game go into the book
+MIN_COUNT = 2 # ignore moves that were only played this few times
+
+def _winner(record):
+    # The color that won a stored OGS game, or None if we can't tell
+    if record.get("white_lost") and not record.get("black_lost"):
+        return Board.BLACK
+    elif record.get("black_lost") and not record.get("white_lost"):
+        return Board.WHITE
+    return None
+
+def _count_game(counts, board_moves, winner, max_depth):
+    # board_moves yields (board, move index) before each move, None for a pass
+    for move_num, (board, idx) in enumerate(board_moves):
+        if move_num >= max_depth or idx is None:
+            break # stop at the first pass; that's not opening theory
+        if not board.is_legal_index(idx):
+            break # a corrupt record; keep what we had up to here
+        stats = counts[(board.hash, board.size, idx)]
+        stats[0] += 1
+        if board.player == winner:
+            stats[1] += 1
+
+def _api_board_moves(size, moves):
+    board = Board.empty_board(size)
+    for x, y in moves:
+        if x < 0 or y < 0:
+            yield board, None
+            board.pass_turn()
+        else:
+            idx = board.geometry.index((x, y))
+            yield board, idx
+            board.play_index(idx)
+
+def _write(counts, path, min_count):
+    records = sorted(
+        (position_hash, size, idx, played, wins)
+        for (position_hash, size, idx), (played, wins) in counts.iteritems()
+        if played >= min_count
+    )
+    tmp_path = "%s.tmp"%path
+    with open(tmp_path, "wb") as file_:
+        file_.write(HEADER.pack(MAGIC, len(records)))
+        for rec in records:
+            file_.write(RECORD.pack(*rec))
+    os.rename(tmp_path, path)
+    return len(records)
+
+def build(store, path=DEFAULT_PATH, max_depth=MAX_DEPTH, min_count=MIN_COUNT):
+    """ Writes a book of the store's finished games to path, and returns how many
+        (position, move) records it holds
+    """
+    counts = defaultdict(lambda: [0, 0]) # (hash, size, move index) -> [times played, wins]
+    for record, moves in store.iter_games(state="finished"):
+        if record["width"] == record["height"]:
+            _count_game(counts, _api_board_moves(record["width"], moves), _winner(record), max_depth)
+    return _write(counts, path, min_count)
+
+def _count_sgf_file(max_depth, path, games):
+    # Runs in a corpus worker process
+    counts = defaultdict(lambda: [0, 0])
+    for game in games:
+        board_moves = ((board, idx) for board, color, idx in game.replay())
+        _count_game(counts, board_moves, game.winner, max_depth)
+    return dict(counts) # a defaultdict of a lambda doesn't pickle
+
+def build_from_sgf(paths, path=DEFAULT_PATH, max_depth=MAX_DEPTH, min_count=MIN_COUNT, num_workers=None):
+    """ Like build, but from the games in SGF files (or directories of them),
+        counted in parallel by a corpus worker pool
+    """
+    import corpus
+    counts = defaultdict(lambda: [0, 0])
+    for file_counts in corpus.map_files(functools.partial(_count_sgf_file, max_depth), paths, num_workers):
+        for key, (played, wins) in file_counts.iteritems():
+            stats = counts[key]
+            stats[0] += played
+            stats[1] += wins
+    return _write(counts, path, min_count)
+
+class Opening_Book(object):
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as file_:
+            self.data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_records = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or len(self.data) != HEADER.size + self.num_records*RECORD.size:
+            self.data.close()
+            raise Exception, "%s isn't an opening book (or is truncated)"%path
+
+    def close(self):
+        self.data.close()
+
+    def _record(self, record_num):
+        return RECORD.unpack_from(self.data, HEADER.size + record_num*RECORD.size)
+
+    def lookup(self, board):
+        # Returns [(move index, times played, wins)] for board's position
+        position = (board.hash, board.size)
+        lo, hi = 0, self.num_records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[:2] < position:
+                lo = mid + 1
+            else:
+                hi = mid
+        res = []
+        for record_num in xrange(lo, self.num_records):
+            record_hash, size, idx, played, wins = self._record(record_num)
+            if (record_hash, size) != position:
+                break
+            res.append((idx, played, wins))
+        return res
+
+    def best_move(self, board):
+        # The book's Coord for board (its most played move, then the one that won
+        # most often), or None if the position isn't in the book
+        candidates = [
+            (played, wins, idx)
+            for idx, played, wins in self.lookup(board)
+            if board.is_legal_index(idx) # guards against hash collisions
+        ]
+        if not candidates:
+            return None
+        played, wins, idx = max(candidates)
+        return board.geometry.coords[idx]
+
+    def __len__(self):
+        return self.num_records
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+# Root-parallel MCTS: every worker process searches the same position
+# independently with its own random seed, and we add up the visit/win counts of
+# the root's children before picking the most visited move.
+#
+# The pool is created on first use and kept alive for the life of the process,
+# so its cost is paid once rather than on every move or every game.
+
+import atexit
+import multiprocessing
+import random
+import threading
+from time import time
+
+import mcts
+
+_pool = None
+_pool_size = None
+_pool_lock = threading.Lock()
+
+def get_pool(num_workers=None):
+    """ Returns the shared worker pool, (re)creating it if num_workers changed """
+    global _pool, _pool_size
+    num_workers = num_workers or multiprocessing.cpu_count()
+    with _pool_lock:
+        if _pool is None or _pool_size != num_workers:
+            if _pool is not None:
+                _pool.terminate()
+            _pool = multiprocessing.Pool(num_workers)
+            _pool_size = num_workers
+        return _pool
+
+def shutdown_pool():
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool.join()
+        _pool = None
+        _pool_size = None
+
+atexit.register(shutdown_pool)
+
+def _search_worker((board, seconds, playouts, komi, deadline, policy, seed)):
+    # Runs in a worker process. board arrives via Board's compact pickled form.
+    result = mcts.search(
+        board,
+        seconds=seconds,
+        playouts=playouts,
+        komi=komi,
+        deadline=deadline,
+        policy=policy,
+        rng=random.Random(seed),
+    )
+    return result.playouts, [
+        (child.move, child.visits, child.wins)
+        for child in result.root.children
+    ]
+
+def search(board, seconds=None, playouts=None, komi=6.5, num_workers=None, deadline=None, policy=mcts.playout):
+    """ Same interface as mcts.search, spread over the shared pool.
+        A playout budget is split evenly between the workers; a time budget applies
+        to each of them.
+    """
+    if seconds is None and playouts is None and deadline is None:
+        raise ValueError("search needs a time or playout budget")
+    pool = get_pool(num_workers)
+    start = time()
+    seeds = [random.getrandbits(32) for worker_num in xrange(_pool_size)]
+    if playouts is not None:
+        playouts_per_worker = [
+            playouts // _pool_size + (1 if worker_num < playouts % _pool_size else 0)
+            for worker_num in xrange(_pool_size)
+        ]
+    else:
+        playouts_per_worker = [None] * _pool_size
+    tasks = [
+        (board, seconds, worker_playouts, komi, deadline, policy, seed)
+        for worker_playouts, seed in zip(playouts_per_worker, seeds)
+    ]
+    results = pool.map(_search_worker, tasks, chunksize=1)
+
+    # Merge the root statistics into a single root node
+    root = mcts.Node(None, None, board.BLACK + board.WHITE - board.player, 0, [])
+    children = {}
+    total_playouts = 0
+    for num_playouts, child_stats in results:
+        total_playouts += num_playouts
+        for move, visits, wins in child_stats:
+            if move not in children:
+                children[move] = mcts.Node(move, root, board.player, 0, [])
+            children[move].visits += visits
+            children[move].wins += wins
+    root.children = children.values()
+    root.visits = total_playouts
+
+    if root.children:
+        move = max(root.children, key=(lambda child: child.visits)).move
+    else:
+        move = mcts.PASS
+    return mcts.Search_Result(move, root, total_playouts, time() - start)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+# A "heavy" playout policy built on 3x3 patterns, for mcts.search.
+#
+# Every point's eight neighbors are kept encoded in a 16-bit pattern code
+# (Board.patterns, updated incrementally as stones come and go), so judging a
+# point's shape is one list lookup into a precomputed table of weights. The
+# tables come from the classic MoGo-style playout patterns (hane, cuts and edge
+# shapes, in every rotation, reflection and color), plus a zero weight for points
+# that are eyes for the player to move, so we never fill our own.
+#
+# Like MoGo, each move answers the previous one: capturing a chain that's in atari
+# near it, or saving one of ours it just put in atari, is most urgent, then the
+# pattern moves around it. Only otherwise (or with probability RANDOM_WEIGHT
+# against the rest) do we play a random non-eye point as a light playout would.
+# That makes for fewer aimless moves, so playouts are shorter and closer to
+# real play.
+#
+# Works on board.Board through its index-level interface, like mcts.
+
+import random
+import string
+
+import utils
+
+NONE, BLACK, WHITE, BORDER = 0, 1, 2, 3
+
+CAPTURE_WEIGHT = 40
+SAVE_WEIGHT = 30
+PATTERN_WEIGHT = 10
+RANDOM_WEIGHT = 4 # the weight of playing somewhere else entirely
+DEFAULT_WEIGHT = 1 # every other legal, non-eye point
+
+# Center is the move. X and O are the two colors (either way round), x is anything
+# but X (O, empty or the edge), o anything but O, "?" anything, "." empty and " "
+# off the board. From michi's pattern set.
+PATTERN_SOURCES = (
+    ("XOX", "...", "???"), # hane: enclosing hane
+    ("XO.", "...", "?.?"), # hane: non-cutting hane
+    ("XO?", "X..", "x.?"), # hane: magari
+    (".O.", "X..", "..."), # katatsuke or diagonal attachment
+    ("XO?", "O.o", "?o?"), # cut1: unprotected cut
+    ("XO?", "O.X", "???"), # cut1: peeped cut
+    ("?X?", "O.O", "ooo"), # cut2
+    ("OX?", "o.O", "???"), # cut keima
+    ("X.?", "O.?", "   "), # side: chase
+    ("OX?", "X.O", "   "), # side: block side cut
+    ("?X?", "x.O", "   "), # side: block side connection
+    ("?XO", "x.x", "   "), # side: sagari
+    ("?OX", "X.O", "   "), # side: cut
+)
+_CELL_VALUES = {".": (NONE,), "X": (BLACK,), "O": (WHITE,), " ": (BORDER,),
+                "x": (NONE, WHITE, BORDER), "o": (NONE, BLACK, BORDER), "?": (NONE, BLACK, WHITE, BORDER)}
+
+def _rotate(pattern):
+    return tuple("".join(pattern[2-col][row] for col in xrange(3)) for row in xrange(3))
+
+def _flip(pattern):
+    return tuple(row[::-1] for row in pattern)
+
+_SWAP = string.maketrans("XOxo", "OXox")
+
+def _swap_colors(pattern):
+    return tuple(row.translate(_SWAP) for row in pattern)
+
+def _variants(pattern):
+    res = set()
+    for swapped in (pattern, _swap_colors(pattern)):
+        for flipped in (swapped, _flip(swapped)):
+            rotated = flipped
+            for rotation_num in xrange(4):
+                res.add(rotated)
+                rotated = _rotate(rotated)
+    return res
+
+def _codes(pattern):
+    # Every pattern code the pattern matches (the order matches Board_Geometry.pattern_offsets)
+    cells = "".join(pattern)
+    cells = cells[:4] + cells[5:] # the center is the move itself
+    codes = [0]
+    for direction, cell in enumerate(cells):
+        codes = [code | (value << 2*direction) for code in codes for value in _CELL_VALUES[cell]]
+    return codes
+
+def _eye_codes(color):
+    # Points that are eyes for color: all four sides are our stones (or the edge),
+    # and the enemy holds at most one diagonal (none at all on the edge)
+    # (Codes for shapes that can't occur on a real board come out too; they're harmless.)
+    enemy = BLACK + WHITE - color
+    codes = []
+    for sides in xrange(16):
+        n, w, e, s = [BORDER if sides & (1 << side) else color for side in xrange(4)]
+        max_enemy_diagonals = 0 if BORDER in (n, w, e, s) else 1
+        for diagonals in xrange(256):
+            nw, ne, sw, se = [(diagonals >> 2*corner) & 3 for corner in xrange(4)]
+            if (nw, ne, sw, se).count(enemy) > max_enemy_diagonals:
+                continue
+            cells = (nw, n, ne, w, e, sw, s, se)
+            codes.append(sum(value << 2*direction for direction, value in enumerate(cells)))
+    return codes
+
+def build_tables():
+    """ Returns weights[color]: a list of 65536 move weights indexed by the pattern
+        code of the point, for color to move
+    """
+    pattern_codes = set()
+    for source in PATTERN_SOURCES:
+        for variant in _variants(source):
+            pattern_codes.update(_codes(variant))
+    weights = [None, None, None]
+    for color in (BLACK, WHITE):
+        table = [DEFAULT_WEIGHT] * (1 << 16)
+        for code in pattern_codes:
+            table[code] = PATTERN_WEIGHT
+        for code in _eye_codes(color):
+            table[code] = 0
+        weights[color] = table
+    return weights
+
+_tables = utils.Shared_Instance(build_tables)
+
+def tables():
+    # Built on first use (it takes a while), then shared; forked workers inherit them
+    return _tables.get()
+
+def _urgent_moves(board, candidates):
+    # Adds (move, weight) candidates for capturing or saving the chains touching
+    # the last move that are in atari
+    last = board.last_move
+    cells = board.cells
+    chain = board.chain
+    chain_libs = board.chain_libs
+    neighbors = board.geometry.neighbors
+    color = board.player
+    heads = set([chain[last]])
+    for nbr in neighbors[last]:
+        if chain[nbr]:
+            heads.add(chain[nbr])
+    for head in heads:
+        libs = chain_libs[head]
+        if len(libs) != 1:
+            continue
+        for lib in libs:
+            if cells[head] != color:
+                candidates.append((lib, CAPTURE_WEIGHT))
+            else:
+                # Save it by capturing something next to it that's in atari too...
+                for stone in board.chain_stones[head]:
+                    for nbr in neighbors[stone]:
+                        if cells[nbr] not in (NONE, color) and len(chain_libs[chain[nbr]]) == 1:
+                            for enemy_lib in chain_libs[chain[nbr]]:
+                                candidates.append((enemy_lib, CAPTURE_WEIGHT))
+                # ...or by extending, if that gets it out of atari
+                new_libs = set(nbr for nbr in neighbors[lib] if cells[nbr] == NONE)
+                for nbr in neighbors[lib]:
+                    if cells[nbr] == color and chain[nbr] != head:
+                        new_libs |= chain_libs[chain[nbr]]
+                new_libs.discard(lib)
+                if len(new_libs) >= 2:
+                    candidates.append((lib, SAVE_WEIGHT))
+
+def choose_move(board, weights, rng=random):
+    """ The playout policy's move (a point index) for the player to move, or None
+        if they should pass. weights is tables()[board.player].
+    """
+    candidates = []
+    patterns = board.patterns
+    last = board.last_move
+    if last:
+        _urgent_moves(board, candidates)
+        cells = board.cells
+        for offset in board.geometry.pattern_offsets:
+            idx = last + offset
+            if cells[idx] == NONE:
+                weight = weights[patterns[idx]]
+                if weight > DEFAULT_WEIGHT:
+                    candidates.append((idx, weight))
+    while candidates:
+        total = RANDOM_WEIGHT + sum(weight for idx, weight in candidates)
+        pick = rng.random() * total
+        if pick < RANDOM_WEIGHT:
+            break
+        pick -= RANDOM_WEIGHT
+        for candidate_num, (idx, weight) in enumerate(candidates):
+            pick -= weight
+            if pick < 0:
+                break
+        if board.is_legal_index(idx) and weights[patterns[idx]]:
+            return idx
+        del candidates[candidate_num]
+    return board.random_legal_index(rng, weights=weights)
+
+def playout(board, rng=random, max_moves=None):
+    # Like mcts.playout, but with moves from choose_move. Mutates board.
+    if max_moves is None:
+        max_moves = 3 * board.size * board.size
+    weights = tables()
+    num_passes = 0
+    for move_num in xrange(max_moves):
+        idx = choose_move(board, weights[board.player], rng)
+        if idx is None:
+            board.pass_turn()
+            num_passes += 1
+            if num_passes >= 2:
+                break
+        else:
+            board.play_index(idx)
+            num_passes = 0
+    return board
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+import logging
+import threading
+from time import sleep, time
+
+import utils
+import ogs_metrics
+from ogs_api import shared_agent
+from board import Coord, Game
+
+logger = logging.getLogger("play")
+
+def play_turn(strategy, board, last_move, book=None):
+    # Answers straight from the opening book (an opening_book.Opening_Book) when it
+    # knows the position, and otherwise lets the strategy think
+    if book is not None and hasattr(strategy, "send_move"):
+        coord = book.best_move(board)
+        if coord is not None:
+            strategy.send_move(coord)
+            return utils.Either(True, coord)
+    return strategy.play(board, last_move)
+
+def play_game(p1, p2, fetch_game, book=None):
+    # assumes p1 will go first. Returns once the game is over.
+    data = fetch_game()
+    p1.observe_game(data, time())
+    game = Game.from_game_api(data)
+    e_p2_move = utils.Either(True, None)
+    while True:
+        e_p1_move = play_turn(p1, game.board, e_p2_move.contents(), book)
+        if type(e_p1_move) != type(utils.Either(True, 0)):
+            raise Exception, "Bad return type from Go_Strategy interface; must return an Either"
+        print "Got p1's move: {}".format(e_p1_move.contents())
+        game.play(e_p1_move.contents())
+
+        e_p2_move = p2.play(game.board, e_p1_move.contents())
+        if type(e_p2_move) != type(utils.Either(True, 0)): # TODO: this is ugly
+            raise Exception, "Bad return type from Go_Strategy interface; must return an Either"
+        print "Got p2's move: {}".format(e_p2_move.contents())
+        game.play(e_p2_move.contents())
+
+        # Check our local state against the server once per turn. This only replays
+        # moves we haven't seen, unless the two disagree.
+        data = fetch_game()
+        p1.observe_game(data, time())
+        if not game.sync(data):
+            print "Local game state diverged from the server; resynced"
+
+        if data["gamedata"].get("phase") == "finished" or (
+            e_p1_move.contents().is_pass and e_p2_move.contents().is_pass
+        ):
+            return
+
+def play_ogs_game(gid, p1, p2, book=None):
+    # TODO: decouple api and game
+    api = shared_agent()
+    try:
+        play_game(p1, p2, (lambda: api.get_game(gid)), book)
+    finally:
+        p1.close()
+        p2.close()
+
+class Game_Manager(object):
+    # Plays all of an account's active games from one process.
+    # The scheduler loop (run) watches me/notifications for games where it's our
+    # turn and hands each one to a pool of worker threads, which sync the game,
+    # let that game's strategy think and submit its move. Each game gets its own
+    # strategy (from make_strategy(game_id), e.g. Random_Strategy or MCTS_Strategy)
+    # and is never worked on by two threads at once. With a game_store.Game_Store,
+    # positions survive restarts instead of being replayed from the API's moves.
+    # With an opening_book.Opening_Book, book positions are answered without thinking.
+    # A failed cycle (e.g. the API being down) is logged and retried on the next one,
+    # and every refresh_period seconds all our active games are checked, to pick up
+    # turns we haven't had a notification for.
+    def __init__(self, make_strategy, api=None, num_workers=8, poll_period=5, refresh_period=300, metrics_file=None, store=None, book=None):
+        self.make_strategy = make_strategy
+        self.api = api or shared_agent()
+        self.poll_period = poll_period
+        self.refresh_period = refresh_period
+        self.last_refresh = None
+        self.metrics_file = metrics_file # if set, ogs_metrics are dumped here every cycle
+        self.store = store
+        self.book = book
+        self.games = {} # game_id -> Game
+        self.strategies = {} # game_id -> Go_Strategy
+        self.in_progress = set()
+        self.lock = threading.Lock()
+        from multiprocessing.pool import ThreadPool
+        self.executor = ThreadPool(num_workers)
+        self.player_id = None
+
+    def refresh_games(self):
+        # Checks every game we're currently playing, not just the ones we've had a
+        # notification for. _take_turn leaves the ones where it isn't our turn.
+        for game in self.api.get_my_current_games():
+            self.dispatch(game["id"])
+
+    def run(self, max_cycles=None):
+        cycle_num = 0
+        while max_cycles is None or cycle_num < max_cycles:
+            try:
+                self.run_cycle()
+            except Exception:
+                logger.exception("Scheduler cycle %d failed; retrying in %ss", cycle_num, self.poll_period)
+            cycle_num += 1
+            sleep(self.poll_period)
+
+    def run_cycle(self):
+        if self.player_id is None:
+            self.player_id = self.api.sget("me")["id"]
+        if self.last_refresh is None or time() - self.last_refresh >= self.refresh_period:
+            self.refresh_games()
+            self.last_refresh = time()
+        for game_id in self.api.get_game_ids_where_its_my_turn():
+            self.dispatch(game_id)
+        if self.metrics_file:
+            ogs_metrics.registry().dump(self.metrics_file)
+
+    def dispatch(self, game_id):
+        with self.lock:
+            if game_id in self.in_progress:
+                return
+            self.in_progress.add(game_id)
+            if game_id not in self.strategies:
+                self.strategies[game_id] = self.make_strategy(game_id)
+        self.executor.apply_async(self._take_turn, (game_id,))
+
+    def _take_turn(self, game_id):
+        try:
+            data = self.api.get_game(game_id)
+            received_at = time()
+            gamedata = data["gamedata"]
+            if gamedata.get("phase") == "finished":
+                self._forget(game_id)
+                return
+            # notifications can lag behind; only move when the server agrees it's our turn
+            if gamedata["clock"]["current_player"] != self.player_id:
+                return
+
+            game = self.games.get(game_id)
+            if game is None and self.store is not None:
+                game = self.store.load_game(game_id)
+            if game is None:
+                game = Game.from_game_api(data)
+            else:
+                game.sync(data)
+            self.games[game_id] = game
+
+            last_move = None
+            if gamedata["moves"]:
+                x, y = gamedata["moves"][-1][:2]
+                last_move = Coord.from_numeric(game.size, (x, y))
+
+            strategy = self.strategies[game_id]
+            strategy.observe_game(data, received_at)
+            e_move = play_turn(strategy, game.board, last_move, self.book)
+            if e_move:
+                game.play(e_move.contents())
+                if self.store is not None:
+                    self.store.save_game(data, game)
+            else:
+                self.api.log("Game %d: strategy failed: %s"%(game_id, e_move.value))
+        except Exception:
+            logger.exception("Game %d: couldn't take our turn", game_id)
+        finally:
+            with self.lock:
+                self.in_progress.discard(game_id)
+
+    def _forget(self, game_id):
+        with self.lock:
+            self.games.pop(game_id, None)
+            strategy = self.strategies.pop(game_id, None)
+        if strategy is not None:
+            strategy.close()
+
+    def close(self):
+        self.executor.close()
+        self.executor.join()
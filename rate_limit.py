@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# Client-side rate limiting shared by every OGS_API_Agent in the process.
+# Requests take a token from a token bucket before going out. When tokens are
+# short, waiting requests are served strictly by priority, so a move submission
+# never queues behind background polling or listing sweeps. A 429 from the server
+# empties the bucket and pauses everyone until its Retry-After has passed.
+
+import threading
+from time import time
+
+import utils
+
+# Priorities, most urgent first
+MOVE = 0 # move and pass submissions
+POLL = 1 # ordinary requests, e.g. fetching a game we're waiting on
+LISTING = 2 # bulk/background traffic, e.g. get_all and iter_all pages
+PRIORITIES = (MOVE, POLL, LISTING)
+
+DEFAULT_RETRY_AFTER = 5.0 # seconds, for a 429 without a usable Retry-After
+
+class Token_Bucket_Scheduler(object):
+    def __init__(self, rate=5.0, burst=10):
+        self.rate = float(rate) # tokens added per second
+        self.burst = burst # bucket capacity
+        self.tokens = float(burst)
+        self.updated = time()
+        self.blocked_until = 0.0
+        self.waiting = [0] * len(PRIORITIES)
+        self.cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated)*self.rate)
+        self.updated = now
+
+    def acquire(self, priority=POLL):
+        # Blocks until a request of this priority may be sent
+        with self.cond:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    now = time()
+                    self._refill(now)
+                    higher_waiting = any(self.waiting[higher] for higher in xrange(priority))
+                    if now >= self.blocked_until and self.tokens >= 1 and not higher_waiting:
+                        self.tokens -= 1
+                        return
+                    if now < self.blocked_until:
+                        timeout = self.blocked_until - now
+                    elif self.tokens < 1:
+                        timeout = (1 - self.tokens) / self.rate
+                    else:
+                        timeout = None # wait for the higher priority request(s) to go first
+                    self.cond.wait(timeout)
+            finally:
+                self.waiting[priority] -= 1
+                self.cond.notify_all()
+
+    def penalize(self, retry_after):
+        # The server told us to back off for retry_after seconds
+        with self.cond:
+            self.blocked_until = max(self.blocked_until, time() + retry_after)
+            self.tokens = 0.0
+            self.updated = time()
+            self.cond.notify_all()
+
+def parse_retry_after(value, default=DEFAULT_RETRY_AFTER):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # email.utils is slow to import, and we rarely get here, so it's imported late
+        from email.utils import parsedate_tz, mktime_tz
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return default
+        return max(0.0, mktime_tz(parsed) - time())
+
+_shared_scheduler = utils.Shared_Instance(Token_Bucket_Scheduler)
+
+def shared_scheduler():
+    return _shared_scheduler.get()
+
+def configure_shared_scheduler(**kwargs):
+    """ Replaces the process-wide scheduler, e.g. to change the rate or burst size """
+    return _shared_scheduler.replace(**kwargs)
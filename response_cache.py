@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# A bounded LRU cache of GET responses, shared by every OGS_API_Agent in the
+# process. Each endpoint gets a TTL: within it we answer from the cache without
+# touching the network, and after it we revalidate with If-None-Match /
+# If-Modified-Since, so an unchanged resource costs a 304 instead of the full body.
+# A TTL of 0 means "always revalidate", which is what we want for anything whose
+# changes we're waiting on (e.g. a game's moves).
+
+import threading
+from time import time
+from collections import OrderedDict
+
+import utils
+import ogs_metrics
+
+# ogs_metrics.endpoint_name(url) -> seconds
+DEFAULT_TTLS = {
+    "games/:id": 0,
+    "me/notifications": 0,
+    "me/games": 5,
+    "games": 30,
+    "me": 3600,
+}
+DEFAULT_TTL = 0
+
+class Cache_Entry(object):
+    __slots__ = ("body", "etag", "last_modified", "expires")
+
+    def __init__(self, body, etag, last_modified, expires):
+        self.body = body # the raw response text; callers get a fresh parse of it every time
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def can_revalidate(self):
+        return self.etag is not None or self.last_modified is not None
+
+    def validation_headers(self):
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class Response_Cache(object):
+    def __init__(self, max_entries=256, ttls=DEFAULT_TTLS, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries # 0 disables caching
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict() # key -> Cache_Entry, least recently used first
+        self.lock = threading.Lock()
+
+    def ttl(self, url):
+        return self.ttls.get(ogs_metrics.endpoint_name(url), self.default_ttl)
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry # most recently used
+            return entry
+
+    def store(self, key, url, response):
+        # Remembers a 200 response, if it's worth remembering
+        if self.max_entries <= 0 or "no-store" in response.headers.get("Cache-Control", ""):
+            return
+        ttl = self.ttl(url)
+        entry = Cache_Entry(
+            response.text,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            time() + ttl,
+        )
+        if ttl <= 0 and not entry.can_revalidate():
+            return # we'd never be able to use it
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def refresh(self, url, entry, response):
+        # A 304 confirmed the entry is still current
+        with self.lock:
+            entry.etag = response.headers.get("ETag", entry.etag)
+            entry.last_modified = response.headers.get("Last-Modified", entry.last_modified)
+            entry.expires = time() + self.ttl(url)
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+_shared_cache = utils.Shared_Instance(Response_Cache)
+
+def shared_cache():
+    return _shared_cache.get()
+
+def configure_shared_cache(**kwargs):
+    """ Replaces the process-wide cache, e.g. to change its size or TTLs """
+    return _shared_cache.replace(**kwargs)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+# Checks board.Board's rules (captures, suicide, ko and positional superko) and
+# the state it keeps up to date as it goes (chains, their liberties, the empty
+# point list and the 3x3 pattern codes) against a slow reference that works
+# everything out from scratch with flood fills. First a few hand-made positions,
+# then seeded random games, compared move by move. Run it after touching board.py:
+#
+#   python rules_check.py            # exits 1 if anything disagrees
+#   python rules_check.py --games 500 --seed 7
+
+import sys
+import random
+import pickle
+import argparse
+
+from board import Board
+
+SEED = 1234
+NUM_GAMES = 60
+SIZES = (5, 7, 9)
+PASS_PROBABILITY = 0.05 # in the random games, so passes (which clear ko) come up too
+
+NONE, BLACK, WHITE = Board.NONE, Board.BLACK, Board.WHITE
+
+class Check_Failed(Exception):
+    pass
+
+def check(condition, msg, *args):
+    if not condition:
+        raise Check_Failed(msg%args)
+
+# The reference: positions are tuples of cells in Board's layout
+
+def _flood(cells, neighbors, start):
+    # (stones, liberties) of the chain at start
+    color = cells[start]
+    stones = set([start])
+    libs = set()
+    todo = [start]
+    while todo:
+        idx = todo.pop()
+        for nbr in neighbors[idx]:
+            if cells[nbr] == color and nbr not in stones:
+                stones.add(nbr)
+                todo.append(nbr)
+            elif cells[nbr] == NONE:
+                libs.add(nbr)
+    return stones, libs
+
+def reference_play(cells, neighbors, idx, color, history):
+    # The position after color plays at idx, or None if that's illegal
+    if cells[idx] != NONE:
+        return None
+    cells = list(cells)
+    cells[idx] = color
+    for nbr in neighbors[idx]:
+        if cells[nbr] == BLACK + WHITE - color:
+            stones, libs = _flood(cells, neighbors, nbr)
+            if not libs:
+                for stone in stones:
+                    cells[stone] = NONE
+    if not _flood(cells, neighbors, idx)[1]:
+        return None # suicide
+    cells = tuple(cells)
+    if cells in history:
+        return None # positional superko (which covers simple ko)
+    return cells
+
+def reference_score(cells, geometry, komi):
+    # Area score from black's point of view
+    score = -komi
+    seen = set()
+    for idx in geometry.points:
+        if cells[idx] == BLACK:
+            score += 1
+        elif cells[idx] == WHITE:
+            score -= 1
+        elif idx not in seen:
+            region, reaches = set([idx]), set()
+            todo = [idx]
+            while todo:
+                point = todo.pop()
+                for nbr in geometry.neighbors[point]:
+                    if cells[nbr] == NONE:
+                        if nbr not in region:
+                            region.add(nbr)
+                            todo.append(nbr)
+                    else:
+                        reaches.add(cells[nbr])
+            seen |= region
+            if reaches == set([BLACK]):
+                score += len(region)
+            elif reaches == set([WHITE]):
+                score -= len(region)
+    return score
+
+def check_board_state(board):
+    # Everything Board keeps incrementally matches what its cells say
+    cells = board.cells
+    geometry = board.geometry
+    for idx in geometry.points:
+        if cells[idx] == NONE:
+            check(board.chain[idx] == 0, "empty point %d belongs to chain %d", idx, board.chain[idx])
+            continue
+        stones, libs = _flood(cells, geometry.neighbors, idx)
+        head = board.chain[idx]
+        check(set(board.chain_stones.get(head, ())) == stones, "chain at %d has the wrong stones", idx)
+        check(board.chain_libs.get(head) == libs, "chain at %d has liberties %s, not %s", idx, board.chain_libs.get(head), libs)
+    heads = set(board.chain[idx] for idx in geometry.points if cells[idx] != NONE)
+    check(set(board.chain_stones) == heads == set(board.chain_libs), "stale chains: %s", set(board.chain_stones) - heads)
+    empties = set(idx for idx in geometry.points if cells[idx] == NONE)
+    check(set(board.empties) == empties and len(board.empties) == len(empties), "empty point list is wrong")
+    for pos, idx in enumerate(board.empties):
+        check(board.empty_pos[idx] == pos, "empty_pos[%d] is %d, not %d", idx, board.empty_pos[idx], pos)
+    for idx in geometry.points:
+        code = sum(cells[idx + offset] << 2*direction for direction, offset in enumerate(geometry.pattern_offsets))
+        check(board.patterns[idx] == code, "pattern code at %d is %d, not %d", idx, board.patterns[idx], code)
+
+def check_random_game(size, rng):
+    board = Board.empty_board(size)
+    geometry = board.geometry
+    cells = tuple(board.cells)
+    history = set([cells])
+    num_passes = 0
+    for move_num in xrange(3*size*size):
+        legal = {}
+        for idx in geometry.points:
+            after = reference_play(cells, geometry.neighbors, idx, board.player, history)
+            if after is not None:
+                legal[idx] = after
+        check(set(board.legal_indices()) == set(legal), "move %d: legal moves %s, not %s",
+            move_num, sorted(board.legal_indices()), sorted(legal))
+        if not legal or rng.random() < PASS_PROBABILITY:
+            board.pass_turn()
+            num_passes += 1
+            if num_passes >= 2:
+                break
+            continue
+        num_passes = 0
+        idx = rng.choice(sorted(legal))
+        board.play_index(idx)
+        cells = legal[idx]
+        history.add(cells)
+        check(tuple(board.cells) == cells, "move %d (%d): position differs from the reference", move_num, idx)
+        check_board_state(board)
+        if move_num % 10 == 0:
+            check_board_state(board.copy())
+            check_board_state(pickle.loads(pickle.dumps(board, pickle.HIGHEST_PROTOCOL)))
+    check(board.area_score(6.5) == reference_score(cells, geometry, 6.5), "area score %s, not %s",
+        board.area_score(6.5), reference_score(cells, geometry, 6.5))
+
+def _setup(size, moves):
+    # Plays moves, (x, y) pairs or None for a pass, alternately from black
+    board = Board.empty_board(size)
+    for move in moves:
+        if move is None:
+            board.pass_turn()
+        else:
+            idx = board.geometry.index(move)
+            check(board.is_legal_index(idx), "setup move %s is illegal", move)
+            board.play_index(idx)
+    return board
+
+def check_positions():
+    # A corner stone with no liberties is captured
+    board = _setup(5, [(1, 0), (0, 0), (0, 1)])
+    check(board.cells[board.geometry.index((0, 0))] == NONE, "corner stone wasn't captured")
+    check_board_state(board)
+
+    # Playing into a point with no liberties is suicide, unless it captures
+    board = _setup(5, [(1, 0), None, (0, 1)])
+    check(not board.is_legal_index(board.geometry.index((0, 0))), "suicide in the corner is legal")
+    board = _setup(5, [(1, 0), (2, 0), (0, 1), (1, 1), None, (0, 2), None])
+    check(board.is_legal_index(board.geometry.index((0, 0))), "a capture that would otherwise be suicide is illegal")
+    board.play_index(board.geometry.index((0, 0)))
+    check(board.cells[board.geometry.index((1, 0))] == NONE and board.cells[board.geometry.index((0, 1))] == NONE,
+        "the capture didn't remove both stones")
+    check_board_state(board)
+
+    # Ko: black takes, white can't take back at once, but can after a move elsewhere
+    #   . B W .
+    #   B W . W
+    #   . B W .
+    ko_setup = [(1, 0), (2, 0), (0, 1), (3, 1), (1, 2), (2, 2), None, (1, 1), (2, 1)]
+    board = _setup(5, ko_setup)
+    ko_point = board.geometry.index((1, 1))
+    check(board.cells[ko_point] == NONE and board.ko == ko_point, "black's ko capture didn't set the ko point")
+    check(not board.is_legal_index(ko_point), "white can retake the ko at once")
+    board.play_index(board.geometry.index((4, 4)))
+    board.play_index(board.geometry.index((4, 3)))
+    check(board.is_legal_index(ko_point), "white can't retake the ko after a ko threat")
+
+    # Positional superko: passes clear the ko point, but retaking would still
+    # repeat the position from before black's capture
+    board = _setup(5, ko_setup + [None, None])
+    check(board.ko == 0, "passing didn't clear the ko point")
+    check(not board.is_legal_index(ko_point), "white can retake the ko after two passes (superko)")
+    check(board.copy(keep_history=False).is_legal_index(ko_point), "a copy without history still knows the superko")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check Board's rules against a flood-fill reference")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--games", type=int, default=NUM_GAMES)
+    args = parser.parse_args(argv)
+
+    try:
+        check_positions()
+        rng = random.Random(args.seed)
+        for game_num in xrange(args.games):
+            check_random_game(SIZES[game_num % len(SIZES)], rng)
+    except Check_Failed as e:
+        print >>sys.stderr, "FAILED: %s"%e
+        return 1
+    print >>sys.stderr, "Hand-made positions and %d random games (seed %d) agree with the reference"%(args.games, args.seed)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
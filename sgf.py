@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+# Reading and writing SGF (Smart Game Format, FF[4]) go records.
+#
+# The reader streams: iter_games walks a buffer (a string, or an mmap of a file
+# too big to read in) with a single regex and yields each game as soon as its
+# closing ")" turns up, without ever building a node tree. Only the main line
+# (the first variation at every branch) is kept, and apart from the root node we
+# only look at moves.
+
+import re
+
+from board import Board
+
+_TOKEN = re.compile(r"([();])|([A-Za-z]+)|\[((?:[^\\\]]|\\.)*)\]", re.S)
+_UNESCAPE = re.compile(r"\\(\n\r?|\r\n?|.)", re.S)
+_COLORS = {"B": Board.BLACK, "W": Board.WHITE}
+_LETTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+PASS = (-1, -1)
+
+def _unescape(value):
+    # Escaped line breaks are soft and disappear; anything else escaped stands for itself
+    return _UNESCAPE.sub((lambda match: "" if match.group(1)[0] in "\r\n" else match.group(1)), value)
+
+def _text(value):
+    return value.encode("utf-8") if isinstance(value, unicode) else str(value)
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("]", "\\]")
+
+def _point(value, size):
+    # "dp" -> (3, 15). An empty value (or "tt" on boards up to 19x19) is a pass.
+    if not value or (value == "tt" and size <= 19):
+        return PASS
+    return _LETTERS.index(value[0]), _LETTERS.index(value[1])
+
+def _apply(board, idx):
+    if idx is None:
+        board.pass_turn()
+    else:
+        board.play_index(idx)
+
+class Sgf_Game(object):
+    __slots__ = ("properties", "moves")
+
+    def __init__(self, properties, moves):
+        self.properties = properties # root node: property name -> [values], unescaped
+        self.moves = moves # main line: (color, (x, y)), PASS for a pass
+
+    def get(self, name, default=None):
+        values = self.properties.get(name)
+        return values[0] if values else default
+
+    @property
+    def size(self):
+        return int(self.get("SZ", "19").split(":")[0])
+
+    @property
+    def komi(self):
+        return float(self.get("KM", "0") or 0)
+
+    @property
+    def winner(self):
+        # Board.BLACK or Board.WHITE, or None if there's no (decisive) result
+        result = self.get("RE", "")
+        if result.startswith("B+"):
+            return Board.BLACK
+        elif result.startswith("W+"):
+            return Board.WHITE
+        return None
+
+    def _setup_board(self):
+        # An empty board with any setup stones (e.g. fixed handicap) on it
+        size = self.size
+        board = Board.empty_board(size)
+        setup = False
+        for name, color in (("AB", Board.BLACK), ("AW", Board.WHITE)):
+            for value in self.properties.get(name, []):
+                board.cells[board.geometry.index(_point(value, size))] = color
+                setup = True
+        if setup:
+            board._rebuild_chains()
+        player = self.get("PL")
+        if player == "W" or (player is None and self.properties.get("AB") and not self.properties.get("AW")):
+            board.player = Board.WHITE
+        return board
+
+    def replay(self):
+        # Yields (board, color, idx) before each main line move: board is the position
+        # (with color to move) and idx the move's point index, or None for a pass.
+        # The board is the same object throughout, so copy it if you need to keep it.
+        # Moves are played as recorded; check board.is_legal_index(idx) if the
+        # record might be corrupt.
+        board = self._setup_board()
+        for color, xy in self.moves:
+            if board.player != color:
+                board.toggle_player()
+            idx = None if xy == PASS else board.geometry.index(xy)
+            yield board, color, idx
+            _apply(board, idx)
+
+    def to_board(self):
+        # The final position. Raises ValueError if the record has an illegal move.
+        board = self._setup_board()
+        for move_num, (color, xy) in enumerate(self.moves):
+            if board.player != color:
+                board.toggle_player()
+            idx = None if xy == PASS else board.geometry.index(xy)
+            if idx is not None and not board.is_legal_index(idx):
+                raise ValueError("Illegal move %d: %s"%(move_num, xy))
+            _apply(board, idx)
+        return board
+
+    def to_game_api(self, game_id=None):
+        # The game in the API's JSON format (as for Board.from_game_api or
+        # Game_Store.ingest_games). That format has no setup stones, so this is only
+        # faithful for games without them (e.g. no fixed handicap).
+        size = self.size
+        record = {
+            "id": game_id,
+            "width": size,
+            "height": size,
+            "komi": self.komi,
+            "players": {
+                "black": {"username": self.get("PB")},
+                "white": {"username": self.get("PW")},
+            },
+            "gamedata": {"moves": [[x, y, 0] for color, (x, y) in self.moves]},
+        }
+        winner = self.winner
+        if winner is not None:
+            record["black_lost"] = winner == Board.WHITE
+            record["white_lost"] = winner == Board.BLACK
+        return record
+
+def iter_games(data):
+    """ Yields an Sgf_Game for every game tree in data (a string or mmap) """
+    depth = 0
+    skip_from = None # while not None, we're inside a variation off the main line
+    has_child = [] # has_child[d]: has the tree at depth d opened a subtree yet?
+    properties = moves = node = size = None
+    name = None
+    for match in _TOKEN.finditer(data):
+        punct, ident, value = match.groups()
+        if punct == "(":
+            if depth == 0:
+                properties, moves, node, size = None, [], None, None
+            elif skip_from is None:
+                if has_child[depth - 1]:
+                    skip_from = depth + 1
+                has_child[depth - 1] = True
+            depth += 1
+            has_child.append(False)
+        elif punct == ")":
+            if depth == 0:
+                continue # stray; ignore it
+            depth -= 1
+            has_child.pop()
+            if skip_from is not None and depth < skip_from:
+                skip_from = None
+            if depth == 0 and properties is not None:
+                yield Sgf_Game(properties, moves)
+                properties = None
+        elif depth == 0 or skip_from is not None:
+            continue
+        elif punct == ";":
+            if properties is None:
+                node = properties = {}
+            else:
+                node = None # only the root node's properties are kept
+        elif ident is not None:
+            name = ident
+        elif value is not None and name is not None:
+            if name in _COLORS:
+                if size is None: # SZ comes before the first move, in the root node
+                    size = int((properties.get("SZ") or ["19"])[0].split(":")[0])
+                moves.append((_COLORS[name], _point(value, size)))
+            elif node is not None:
+                node.setdefault(name, []).append(_unescape(value))
+
+def loads(text):
+    return list(iter_games(text))
+
+def dumps(size, moves, properties=None, first_player=Board.BLACK):
+    """ A single-game SGF. moves are (x, y) pairs (PASS for a pass), alternating
+        colors starting with first_player; properties are extra root properties
+        (name -> value or list of values).
+    """
+    root = [("GM", "1"), ("FF", "4"), ("CA", "UTF-8"), ("SZ", size)]
+    root.extend(sorted((properties or {}).iteritems()))
+    parts = ["(;"]
+    for name, values in root:
+        if values is None:
+            continue
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        parts.append(name + "".join("[%s]"%_escape(_text(value)) for value in values))
+    color = "B" if first_player == Board.BLACK else "W"
+    for move_num, (x, y) in enumerate(moves):
+        point = "" if (x, y) == PASS else _LETTERS[x] + _LETTERS[y]
+        parts.append("\n;%s[%s]"%(color, point) if move_num % 10 == 0 else ";%s[%s]"%(color, point))
+        color = "W" if color == "B" else "B"
+    parts.append(")\n")
+    return "".join(parts)
+
+def _ogs_result(record):
+    # OGS outcomes look like "7.5 points", "Resignation" or "Timeout"
+    if record.get("white_lost") and not record.get("black_lost"):
+        winner = "B"
+    elif record.get("black_lost") and not record.get("white_lost"):
+        winner = "W"
+    else:
+        return None
+    outcome = record.get("outcome") or ""
+    if outcome.endswith(" points"):
+        return "%s+%s"%(winner, outcome[:-len(" points")])
+    elif outcome.lower().startswith("resign"):
+        return "%s+R"%winner
+    elif outcome.lower().startswith("timeout"):
+        return "%s+T"%winner
+    return "%s+"%winner
+
+def from_ogs_game(record):
+    """ An SGF for a game in the API's JSON format (e.g. from get_game or Game_Store.get_game) """
+    players = record.get("players") or {}
+    gamedata = record.get("gamedata") or {}
+    komi = record.get("komi", gamedata.get("komi"))
+    return dumps(
+        record["width"],
+        [tuple(move[:2]) for move in gamedata.get("moves", [])],
+        {
+            "PB": (players.get("black") or {}).get("username"),
+            "PW": (players.get("white") or {}).get("username"),
+            "KM": komi,
+            "RE": _ogs_result(record),
+            "GN": "OGS game %s"%record["id"] if record.get("id") is not None else None,
+            "PC": "online-go.com",
+        },
+    )
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+from time import sleep, time
+
+import utils
+import ogs_realtime
+import ogs_metrics
+import rate_limit
+import mcts
+import transposition
+from ogs_api import shared_agent
+from time_manager import Time_Manager
+from board import Coord, Pass
+
+class Go_Strategy(object):
+    # TODO: look into making this an ABC maybe: https://docs.python.org/2/library/abc.html
+    def play(self, board):
+        # Board -> Either(Move)
+        raise NotImplementedError( "Should have implemented this" )
+
+    def observe_game(self, game, received_at=None):
+        # Called with the game's API JSON (fetched at received_at) before each of our turns
+        pass
+
+    def close(self):
+        # Called once the game is over, to let go of connections and such
+        pass
+
+class OGS_Reciever_Strategy(Go_Strategy):
+    def __init__(self, game_id, api=None):
+        super(OGS_Reciever_Strategy, self).__init__()
+        self.game_id = game_id
+        self.api = api or shared_agent()
+        self.last_move_number = None # how many moves the game had when we last looked
+
+    def play(self, board, last_move):
+        POLL_PERIOD = 5
+        MAX_POLL_ATTEMPTS = 10
+        our_move_number = self._our_move_number(last_move)
+        for attempt_num in xrange(MAX_POLL_ATTEMPTS):
+            self.api.log("Poll attempt #%d..."%attempt_num)
+            coord = self._poll_once(board, last_move, our_move_number)
+            if coord is not None:
+                return utils.Either(True, coord)
+            if our_move_number is None:
+                our_move_number = self.last_move_number # the last move was ours
+            sleep(POLL_PERIOD)
+        return utils.Either(False, "Gave up polling for opponent response")
+
+    def _our_move_number(self, last_move):
+        # The number of last_move (the move we just made), if we know how many moves
+        # came before it. Moves are told apart by number, since coordinates can't
+        # tell our pass from the opponent's.
+        if last_move is None or self.last_move_number is None:
+            return None
+        return self.last_move_number + 1
+
+    def _is_opponent_move(self, move_number, coord, last_move, our_move_number):
+        if move_number is not None and our_move_number is not None:
+            return move_number > our_move_number
+        # Without numbers, all we can do is skip a move that looks like ours
+        return last_move != coord
+
+    def _poll_once(self, board, last_move, our_move_number=None):
+        # Returns the opponent's move if it has been played, otherwise None
+        ogs_metrics.registry().increment("ogs_polls_total", strategy=self.__class__.__name__)
+        game = self.api.get_game(self.game_id)
+
+        moves = game["gamedata"]["moves"]
+        self.last_move_number = len(moves)
+        x, y, time = moves[-1]
+        coord = Coord.from_numeric(board.size, (x, y))
+
+        if self._is_opponent_move(len(moves), coord, last_move, our_move_number):
+            print "Recieved opponent's move:", coord
+            return coord
+        return None
+
+class OGS_Realtime_Reciever_Strategy(OGS_Reciever_Strategy):
+    # Waits on the OGS realtime game channel, so we wake up as soon as the opponent's
+    # move event arrives instead of sleeping between full game downloads.
+    # Whenever the socket is down we fall back to polling, backing off exponentially
+    # from MIN_POLL_PERIOD to MAX_POLL_PERIOD (no slower than OGS_Reciever_Strategy
+    # polls), and keep trying to resubscribe.
+    # Events are matched to move numbers: anything at or before the last move we
+    # know of (from an earlier event or a poll) is stale, e.g. a move we already
+    # got by polling and then again from the reconnected socket, and is dropped.
+    # The echo of our own move is skipped by its number too.
+    MIN_POLL_PERIOD = 0.5
+    MAX_POLL_PERIOD = 5
+    EVENT_WAIT_SLICE = 1.0 # how often we check whether the socket has dropped
+
+    def __init__(self, game_id, max_wait=300, realtime_url=ogs_realtime.REALTIME_URL, api=None):
+        super(OGS_Realtime_Reciever_Strategy, self).__init__(game_id, api=api)
+        self.max_wait = max_wait
+        self.channel = ogs_realtime.Realtime_Game_Channel(game_id, url=realtime_url)
+
+    def play(self, board, last_move):
+        deadline = time() + self.max_wait
+        poll_period = self.MIN_POLL_PERIOD
+        our_move_number = self._our_move_number(last_move)
+        while time() < deadline:
+            if self.channel.connected:
+                event = self.channel.wait_for_move(
+                    min(self.EVENT_WAIT_SLICE, max(0, deadline - time()))
+                )
+                if event is None:
+                    continue
+                ogs_metrics.registry().increment("ogs_realtime_events_total", strategy=self.__class__.__name__)
+                move_number = event.get("move_number")
+                if move_number is not None:
+                    if self.last_move_number is not None and move_number <= self.last_move_number:
+                        continue # stale
+                    self.last_move_number = move_number
+                x, y, move_time = event["move"][:3]
+                coord = Coord.from_numeric(board.size, (x, y))
+                if self._is_opponent_move(move_number, coord, last_move, our_move_number):
+                    print "Recieved opponent's move:", coord
+                    return utils.Either(True, coord)
+                if our_move_number is None:
+                    our_move_number = move_number # that was the echo of our move
+            else:
+                # (Re)subscribe first, then poll once so a move made while we were
+                # disconnected isn't missed. The poll is at least as new as
+                # anything queued before it, so that can go (events that arrive
+                # after it are checked against its move number instead).
+                self.channel.connect()
+                self.channel.drain()
+                coord = self._poll_once(board, last_move, our_move_number)
+                if coord is not None:
+                    return utils.Either(True, coord)
+                if our_move_number is None:
+                    our_move_number = self.last_move_number # the last move was ours
+                if not self.channel.connected:
+                    sleep(min(poll_period, max(0, deadline - time())))
+                    poll_period = min(2*poll_period, self.MAX_POLL_PERIOD)
+        return utils.Either(False, "Gave up waiting for opponent response")
+
+    def close(self):
+        self.channel.close()
+
+class OGS_Sender_Strategy(Go_Strategy):
+    # Keeps a time_manager.Time_Manager up to date with the game clock and with how
+    # long our moves take to reach the server, for strategies that budget their thinking
+    def __init__(self, game_id, api=None, time_manager=None):
+        self.game_id = game_id
+        self.api = api or shared_agent()
+        self.time_manager = time_manager or Time_Manager()
+
+    def observe_game(self, game, received_at=None):
+        self.time_manager.update(game, received_at)
+
+    def send_move(self, coord):
+        if coord.is_pass:
+            return self.send_pass()
+        self._send("games/%d/move"%self.game_id, '{"move": "%s"}'%coord.api_repr())
+
+    def send_pass(self):
+        self._send("games/%d/pass"%self.game_id, "")
+
+    def _send(self, path, data):
+        start = time()
+        self.api.spost(path,
+            data=data,
+            headers={"Content-Type": "application/json"},
+            priority=rate_limit.MOVE,
+        )
+        self.time_manager.observe_latency(time() - start)
+
+class Always_Pass(OGS_Sender_Strategy):
+    def __init__(self, game_id, api=None):
+        super(Always_Pass, self).__init__(game_id, api=api)
+
+    def play(self, board, last_move):
+        self.send_pass()
+        return utils.Either(True, Pass.for_size(board.size))
+
+class User_Input_Strategy(OGS_Sender_Strategy):
+    def __init__(self, game_id, api=None):
+        super(User_Input_Strategy, self).__init__(game_id, api=api)
+
+    def play(self, board, last_move):
+        print board
+        inp = raw_input("> ")
+        if inp in ["p", "pass"]:
+            self.send_pass()
+            return utils.Either(True, Pass.for_size(board.size))
+        else:
+            coord = Coord.from_visual(board.size, inp)
+            self.send_move(coord)
+            return utils.Either(True, coord)
+
+class Random_Strategy(OGS_Sender_Strategy):
+    def __init__(self, game_id, api=None):
+        super(Random_Strategy, self).__init__(game_id, api=api)
+
+    def play(self, board, last_move):
+        coord = board.random_legal_move()
+        if coord is not None:
+            # print "randomly chose {}".format(coord)
+            self.send_move(coord)
+            return utils.Either(True, coord)
+        else:
+            self.send_pass()
+            return utils.Either(True, Pass.for_size(board.size))
+
+class MCTS_Strategy(OGS_Sender_Strategy):
+    # UCT search with light random playouts (or another playout policy, such as
+    # patterns.playout). Give it a per-move budget of seconds, playouts, or both
+    # (it stops at whichever runs out first).
+    # Once it has seen the game clock (see observe_game), the time manager's budget
+    # replaces seconds, and its deadline always applies.
+    # Searches share the process-wide transposition table unless given their own.
+    def __init__(self, game_id, seconds=5.0, playouts=None, komi=6.5, table=None, api=None, time_manager=None, policy=mcts.playout):
+        super(MCTS_Strategy, self).__init__(game_id, api=api, time_manager=time_manager)
+        self.seconds = seconds
+        self.playouts = playouts
+        self.komi = komi
+        self.policy = policy
+        self.table = transposition.shared_table() if table is None else table
+        self.last_result = None
+
+    def play(self, board, last_move):
+        seconds, deadline = self.time_manager.allocate(self.seconds)
+        result = self._search(board, seconds, deadline)
+        self.last_result = result
+        self.api.log("MCTS: %s"%result)
+        if result.playouts == 0:
+            # Out of time before the first playout; anything beats passing by default
+            coord = board.random_legal_move()
+            if coord is not None:
+                self.send_move(coord)
+                return utils.Either(True, coord)
+        if result.move == mcts.PASS:
+            self.send_pass()
+            return utils.Either(True, Pass.for_size(board.size))
+        else:
+            coord = board.geometry.coords[result.move]
+            self.send_move(coord)
+            return utils.Either(True, coord)
+
+    def _search(self, board, seconds, deadline):
+        return mcts.search(
+            board,
+            seconds=seconds,
+            playouts=self.playouts,
+            komi=self.komi,
+            deadline=deadline,
+            table=self.table,
+            policy=self.policy,
+        )
+
+class Parallel_MCTS_Strategy(MCTS_Strategy):
+    # Root-parallel MCTS over a process pool that is shared by every instance and
+    # kept alive between moves and games. num_workers defaults to the CPU count.
+    # The workers don't share our transposition table, since they're other processes.
+    def __init__(self, game_id, seconds=5.0, playouts=None, komi=6.5, num_workers=None, api=None, time_manager=None, policy=mcts.playout):
+        super(Parallel_MCTS_Strategy, self).__init__(
+            game_id, seconds=seconds, playouts=playouts, komi=komi, api=api, time_manager=time_manager, policy=policy,
+        )
+        self.num_workers = num_workers
+
+    def _search(self, board, seconds, deadline):
+        import parallel_search # only pay for multiprocessing when we actually use it
+        return parallel_search.search(
+            board,
+            seconds=seconds,
+            playouts=self.playouts,
+            komi=self.komi,
+            num_workers=self.num_workers,
+            deadline=deadline,
+            policy=self.policy,
+        )
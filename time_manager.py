@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+# Decides how long an engine may think about each move, from the game clock in
+# the API's game JSON (gamedata.time_control and gamedata.clock).
+#
+# The budget is our remaining main time spread over the moves we expect to still
+# have to play, plus whatever each move earns back (a Fischer increment, or a
+# share of a byo-yomi/Canadian period once we're in overtime). It's then cut by
+# the time it takes our moves to reach the server (measured on every send), so a
+# slow network eats into thinking time rather than into the clock. On top of the
+# budget there's a hard deadline, the latest we can possibly send and still be on
+# time, which the budget never exceeds.
+
+import threading
+from time import time
+
+DEFAULT_LATENCY = 0.5 # seconds, until we've measured any
+LATENCY_WEIGHT = 0.3 # how much each new latency sample moves the estimate
+SAFETY_MARGIN = 1.0 # seconds we never plan to use
+MIN_MOVES_LEFT = 15 # plan for at least this many more moves of our own
+OVERTIME_FRACTION = 0.8 # how much of a byo-yomi period (etc.) we're willing to use
+
+def expected_game_length(size):
+    # Total moves (both players) in a typical game, e.g. ~250 on 19x19
+    return int(0.7 * size * size)
+
+class Time_Manager(object):
+    def __init__(self, safety_margin=SAFETY_MARGIN, min_moves_left=MIN_MOVES_LEFT, overtime_fraction=OVERTIME_FRACTION):
+        self.safety_margin = safety_margin
+        self.min_moves_left = min_moves_left
+        self.overtime_fraction = overtime_fraction
+        self.latency = DEFAULT_LATENCY
+        self.num_latency_samples = 0
+        self.lock = threading.Lock()
+        self.game = None
+        self.received_at = None
+
+    def observe_latency(self, seconds):
+        # Called with how long each move took to send
+        with self.lock:
+            if self.num_latency_samples == 0:
+                self.latency = seconds
+            else:
+                self.latency += LATENCY_WEIGHT * (seconds - self.latency)
+            self.num_latency_samples += 1
+
+    def update(self, game, received_at=None):
+        # Remembers the latest game JSON (from get_game), fetched at received_at
+        self.game = game
+        self.received_at = time() if received_at is None else received_at
+
+    def allocate(self, fallback_seconds=None):
+        """ Returns (seconds, deadline) for the move we're about to think about:
+            seconds is the budget counted from now, and deadline the absolute time
+            (as returned by time.time()) by which we must have finished thinking.
+            Without a usable clock, returns (fallback_seconds, None).
+        """
+        clock_info = self._clock_info()
+        if clock_info is None:
+            return fallback_seconds, None
+        budget, hard_limit = clock_info
+        # Both are counted from when the game JSON arrived
+        hard_deadline = self.received_at + hard_limit
+        deadline = min(self.received_at + budget, hard_deadline)
+        return max(0.0, deadline - time()), deadline
+
+    def _clock_info(self):
+        # (budget, hard limit) in seconds from received_at, or None if there's no clock
+        game = self.game
+        gamedata = (game or {}).get("gamedata") or {}
+        clock = gamedata.get("clock")
+        time_control = gamedata.get("time_control") or (game or {}).get("time_control")
+        if not clock or not isinstance(time_control, dict):
+            return None
+        system = time_control.get("system") or time_control.get("time_control")
+        if system in (None, "none"):
+            return None
+
+        color = "black" if clock.get("current_player") == clock.get("black_player_id") else "white"
+        our_time = clock.get("%s_time"%color)
+        if our_time is None:
+            return None
+        if not isinstance(our_time, dict):
+            our_time = {"thinking_time": our_time}
+        # The clock is as of the last move; take off what's run since then
+        now_ms = clock.get("now") or 1000*self.received_at
+        elapsed = max(0.0, (now_ms - clock.get("last_move", now_ms)) / 1000.0)
+
+        size = game.get("width", 19)
+        moves_left = max(self.min_moves_left, (expected_game_length(size) - len(gamedata.get("moves", []))) // 2)
+
+        # available: what's on our clock for this move; budget: our share of it
+        if system == "simple":
+            available = float(time_control.get("per_move", our_time["thinking_time"])) - elapsed
+            budget = self.overtime_fraction * available
+        else:
+            main = float(our_time.get("thinking_time", 0)) - elapsed
+            if system == "fischer":
+                increment = float(time_control.get("time_increment", 0))
+                available = main
+                budget = main / moves_left + self.overtime_fraction * increment
+            elif system == "byoyomi":
+                period_time = float(our_time.get("period_time") or time_control.get("period_time", 0))
+                periods = our_time.get("periods", time_control.get("periods", 0))
+                if main > 0:
+                    available = main + (period_time if periods else 0)
+                    budget = main / moves_left + self.overtime_fraction * period_time
+                else:
+                    # main time is gone; this move is paid for from the current period
+                    # (spilling into the next one would cost us a period)
+                    available = period_time + main
+                    budget = self.overtime_fraction * available
+            elif system == "canadian":
+                if main > 0:
+                    available = main
+                    budget = main / moves_left
+                else:
+                    block_time = float(our_time.get("block_time", 0)) + main
+                    stones_left = max(1, our_time.get("moves_left", 1))
+                    available = block_time
+                    budget = self.overtime_fraction * block_time / stones_left
+            elif system == "absolute":
+                available = main
+                budget = main / moves_left
+            else:
+                return None
+
+        with self.lock:
+            latency = self.latency
+        hard_limit = max(0.0, available - latency - self.safety_margin)
+        budget = max(0.0, min(budget - latency, hard_limit))
+        return budget, hard_limit
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# A bounded transposition table for search: visit/win statistics keyed by
+# position (Board.hash and size, plus the number of consecutive passes leading to
+# it), so a position reached through a different move order, on a later move or
+# in another game picks up where earlier searches left off instead of starting cold.
+# Entries are evicted (least recently used first) once the memory budget is spent.
+
+import heapq
+import threading
+
+import utils
+
+# Rough cost of one entry: the key tuple, the [visits, wins, last used] list and
+# the dict slot, on a 64-bit CPython 2.7
+ENTRY_BYTES = 400
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+EVICT_FRACTION = 0.25 # how much of the table to drop when it's full
+
+class Transposition_Table(object):
+    # Least recently used eviction, done in batches: every entry remembers when it
+    # was last used, and once the table is full the oldest EVICT_FRACTION of it is
+    # dropped in one go. That keeps lookups to a plain dict access, where an
+    # OrderedDict would reorder itself (in pure Python) on every hit.
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entries = max(1, max_bytes // ENTRY_BYTES)
+        self.entries = {} # key -> [visits, wins, last used]
+        self.clock = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(board, num_passes=0):
+        # Zobrist hashes only tell apart positions of the same size
+        return (board.hash, board.size, num_passes)
+
+    def get(self, key):
+        # Returns (visits, wins), or None if we know nothing about this position
+        with self.lock:
+            stats = self.entries.get(key)
+            if stats is None:
+                self.misses += 1
+                return None
+            self.clock += 1
+            stats[2] = self.clock
+            self.hits += 1
+            return stats[0], stats[1]
+
+    def store(self, key, visits, wins):
+        with self.lock:
+            self.clock += 1
+            self.entries[key] = [visits, wins, self.clock]
+            if len(self.entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        num_evicted = max(1, int(len(self.entries) * EVICT_FRACTION))
+        oldest = heapq.nsmallest(num_evicted, self.entries.iteritems(), key=(lambda item: item[1][2]))
+        for key, stats in oldest:
+            del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+_shared_table = utils.Shared_Instance(Transposition_Table)
+
+def shared_table():
+    return _shared_table.get()
+
+def configure_shared_table(**kwargs):
+    """ Replaces the process-wide table, e.g. to change its memory budget """
+    return _shared_table.replace(**kwargs)
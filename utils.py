@@ -7,6 +7,7 @@ import itertools as itt
 from functools import partial as curry
 # import math
 import re
+import threading
 import ConfigParser
 # import random
 # import sys
@@ -82,7 +83,7 @@ def _rgrep_helper(obj, grep_str):
 
 def file_to_string(filename):
     with open(filename, "r") as file_:
-        return '\n'.join(file_.readlines())
+        return file_.read()
 
 # TODO: naming
 def config_as_dict(filename):
@@ -163,3 +164,28 @@ class Either(object):
         else:
             return Either(False, response)
 
+class Shared_Instance(object):
+    """ A process-wide instance of make(**kwargs), built on first use. Guarded by a
+        lock, so concurrent first uses still build just one.
+    """
+
+    def __init__(self, make):
+        self.make = make
+        self.instance = None
+        self.lock = threading.Lock()
+
+    def get(self, **kwargs):
+        # kwargs are only used if this call builds the instance
+        with self.lock:
+            if self.instance is None:
+                self.instance = self.make(**kwargs)
+            return self.instance
+
+    def replace(self, **kwargs):
+        # Builds a new instance in place of the old one, which is closed if it can be
+        new = self.make(**kwargs)
+        with self.lock:
+            old, self.instance = self.instance, new
+        if old is not None and hasattr(old, "close"):
+            old.close()
+        return new